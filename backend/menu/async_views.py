@@ -0,0 +1,87 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from my_user.authentication import CachedTokenAuthentication, token_cache
+
+
+async def authenticate(request):
+    """Асинхронный аналог CachedTokenAuthentication: (пользователь, токен), (None, None) для
+    анонимного запроса или None, если заголовок нужно проверить синхронным DRF."""
+    auth = get_authorization_header(request).split()
+    if not auth:
+        return None, None
+    if auth[0].lower() != CachedTokenAuthentication.keyword.lower().encode() or len(auth) != 2:
+        return None
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        return None
+    token = await token_cache.aget(key)
+    if token is None or not token.user.is_active:
+        return None
+    return token.user, token
+
+
+def async_read_view(view_class, handler, actions=None, **initkwargs):
+    """Представление, отвечающее на GET асинхронным методом handler класса view_class.
+
+    Остальные методы, форматы кроме JSON, ошибки аутентификации и любые APIException
+    передаются синхронному представлению DRF, поэтому ответы совпадают с ним во всём,
+    кроме пути выполнения. Поддерживаются только классы с одной CachedTokenAuthentication.
+    """
+    sync_view = view_class.as_view(actions, **initkwargs) if actions else view_class.as_view(**initkwargs)
+    run_sync = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        response = None
+        if request.method == 'GET':
+            response = await _handle(view_class(**initkwargs), handler, actions, request, args, kwargs)
+        if response is None:
+            response = await run_sync(request, *args, **kwargs)
+        return response
+
+    view.cls = view_class
+    view.actions = actions or {}
+    return csrf_exempt(view)
+
+
+async def _handle(view, handler, actions, request, args, kwargs):
+    authenticated = await authenticate(request)
+    if authenticated is None:
+        return None
+    drf_request = Request(request, parsers=view.get_parsers(), negotiator=view.get_content_negotiator())
+    drf_request.user, drf_request.auth = authenticated
+    if drf_request.user is None:
+        drf_request.user = api_settings.UNAUTHENTICATED_USER()
+    if actions:
+        view.action_map = actions
+        view.action = actions['get']
+        for method, action in actions.items():
+            setattr(view, method, getattr(view, action))
+    view.setup(drf_request, *args, **kwargs)
+    view.format_kwarg = None
+    view.headers = view.default_response_headers
+    try:
+        view.check_permissions(drf_request)
+        renderer, media_type = view.perform_content_negotiation(drf_request)
+        if not isinstance(renderer, JSONRenderer):
+            return None
+        drf_request.accepted_renderer, drf_request.accepted_media_type = renderer, media_type
+        response = await getattr(view, handler)(drf_request, **kwargs)
+    except APIException:
+        return None
+    response = view.finalize_response(drf_request, response, *args, **kwargs)
+    if not isinstance(response, Response):
+        return response
+    response.render()
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    return plain
@@ -0,0 +1,25 @@
+from django.db import connections, router
+
+
+def delete_by_pk(model, pks):
+    """Удаляет строки model с перечисленными первичными ключами одним DELETE на пачку.
+
+    В отличие от QuerySet.delete() строки не загружаются, сигналы pre_delete/post_delete
+    не отправляются и каскады не обрабатываются. Вызывающий код сам обновляет то, что
+    делают обработчики (счётчики, индексы, версии кэша), и удаляет только строки,
+    на которые не ссылаются другие таблицы. Возвращает число удалённых строк.
+    """
+    pks = list(pks)
+    if not pks:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    batch_size = connection.ops.bulk_batch_size([model._meta.pk], pks) or len(pks)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start:start + batch_size]
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(batch))})', batch)
+            deleted += cursor.rowcount
+    return deleted
@@ -0,0 +1,44 @@
+import json
+import logging
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger('menu.cache')
+
+
+class CacheStats:
+    """Счётчики попаданий и промахов кэша в пределах процесса.
+
+    Каждые CACHE_STATS_LOG_INTERVAL обращений счётчики пишутся JSON-записью в журнал menu.cache.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        self._record(hit=True)
+
+    def miss(self):
+        self._record(hit=False)
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def _record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            report = (self.hits + self.misses) % settings.CACHE_STATS_LOG_INTERVAL == 0 and self.as_dict()
+        if report:
+            logger.info(json.dumps({'event': 'cache_stats', 'cache': self.name, **report}))
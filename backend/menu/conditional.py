@@ -0,0 +1,46 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_get(request, etag_parts, last_modified, render):
+    """Отвечает 304 по If-None-Match / If-Modified-Since, не вызывая render.
+
+    etag_parts — значения, от которых зависит ответ; last_modified — unix-время или None.
+    Версии данных хранятся в кэше Django, поэтому без общего кэша (SHARED_CACHE)
+    валидаторы не выдаются и ответ всегда рендерится.
+    """
+    if not settings.SHARED_CACHE:
+        return render()
+    etag, last_modified, response = _check_validators(request, etag_parts, last_modified)
+    if response is None:
+        response = render()
+    return _set_validators(response, etag, last_modified)
+
+
+async def aconditional_get(request, etag_parts, last_modified, render):
+    """То же, что conditional_get, для асинхронной функции render."""
+    if not settings.SHARED_CACHE:
+        return await render()
+    etag, last_modified, response = _check_validators(request, etag_parts, last_modified)
+    if response is None:
+        response = await render()
+    return _set_validators(response, etag, last_modified)
+
+
+def _check_validators(request, etag_parts, last_modified):
+    etag_source = repr((etag_parts, request.get_full_path(), request.accepted_renderer.format))
+    etag = quote_etag(hashlib.md5(etag_source.encode()).hexdigest())
+    last_modified = int(last_modified) if last_modified is not None else None
+    return etag, last_modified, get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def _set_validators(response, etag, last_modified):
+    if 200 <= response.status_code < 300 or response.status_code == 304:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+    return response
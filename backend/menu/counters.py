@@ -0,0 +1,38 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+class CounterFieldsMixin:
+    """Модель со счётчиками, которые меняются только F()-выражениями.
+
+    При обновлении строки save() пишет все поля, кроме counter_fields, поэтому
+    устаревшие значения счётчиков в экземпляре не затирают параллельные изменения.
+    """
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and field.attname not in skipped and field.name not in skipped]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def refresh_recipe_counter(recipe_ids, relation_model, counter_field):
+    """Пересчитывает счётчик у перечисленных рецептов по фактическому числу связей."""
+    Recipe = relation_model._meta.get_field('recipe').related_model
+    Recipe.objects.filter(pk__in=recipe_ids).update(**{counter_field: count_of(relation_model, 'recipe')})
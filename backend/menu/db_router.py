@@ -0,0 +1,74 @@
+import hashlib
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_ONLY_MODELS = {'authtoken.token'}
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+def sticky_key(credential):
+    return f'replica-sticky:{hashlib.md5(credential.encode()).hexdigest()}'
+
+
+def stick_to_primary(credential):
+    """Чтения с этими учётными данными идут в основную базу REPLICA_LAG_SECONDS секунд.
+
+    Отметка хранится в кэше Django и без общего кэша (SHARED_CACHE) не ставится.
+    """
+    if settings.SHARED_CACHE:
+        cache.set(sticky_key(credential), True, settings.REPLICA_LAG_SECONDS)
+
+
+async def astick_to_primary(credential):
+    if settings.SHARED_CACHE:
+        await cache.aset(sticky_key(credential), True, settings.REPLICA_LAG_SECONDS)
+
+
+def is_sticky(credential):
+    return settings.SHARED_CACHE and cache.get(sticky_key(credential)) is not None
+
+
+async def ais_sticky(credential):
+    return settings.SHARED_CACHE and await cache.aget(sticky_key(credential)) is not None
+
+
+def avoid_stale_replica(changed_at):
+    """Переводит чтения запроса на основную базу, если данные менялись позже,
+    чем реплика гарантированно их получила.
+
+    Иначе ответ из отстающей реплики попал бы в кэш и ETag под новой версией данных.
+    """
+    if read_from_replica.get() and time.time() - changed_at < settings.REPLICA_LAG_SECONDS:
+        read_from_replica.set(False)
+
+
+class PrimaryReplicaRouter:
+    """Чтения безопасных HTTP-запросов направляет в реплику DATABASE_REPLICA_ALIAS, остальное — в основную базу.
+
+    Реплика используется, только если запрос разрешил это через read_from_replica
+    и основная база не находится внутри транзакции.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = settings.DATABASE_REPLICA_ALIAS
+        if (not read_from_replica.get() or alias not in settings.DATABASES
+                or model._meta.label_lower in PRIMARY_ONLY_MODELS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        wrote_to_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,100 @@
+import base64
+import binascii
+import hashlib
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+
+DECODE_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+class DecodedImage:
+    """Проверенное изображение во временном файле; в хранилище попадает только при save().
+
+    Без file изображение уже лежит в хранилище под именем name.
+    """
+
+    def __init__(self, name, file=None):
+        self.name = name
+        self.file = file
+
+    def save(self):
+        """Сохраняет файл под именем name, если его ещё нет, и возвращает имя в хранилище."""
+        if self.file is None:
+            return self.name
+        with self.file:
+            if not default_storage.exists(self.name):
+                self.file.seek(0)
+                self.name = default_storage.save(self.name, File(self.file))
+        self.file = None
+        return self.name
+
+
+def decode_base64_image(data, current_name=None):
+    """Декодирует изображение из data URI во временный файл и называет его по sha256 содержимого.
+
+    Пробельные символы внутри base64 пропускаются. Если содержимое совпадает с файлом
+    current_name, возвращается он без проверки формата.
+    """
+    if not isinstance(data, str):
+        raise ImageDecodeError('Ожидается строка в формате data URI')
+    separator = data.find(';base64,')
+    if separator == -1 or not data.startswith('data:image/'):
+        raise ImageDecodeError('Ожидается изображение в формате data:image/...;base64,')
+
+    digest = hashlib.sha256()
+    tmp = tempfile.TemporaryFile()
+    try:
+        size = 0
+        pending = ''
+        for start in range(separator + len(';base64,'), len(data), DECODE_CHUNK_SIZE):
+            pending += ''.join(data[start:start + DECODE_CHUNK_SIZE].split())
+            aligned = len(pending) - len(pending) % 4
+            chunk = _decode_chunk(pending[:aligned])
+            pending = pending[aligned:]
+            size += len(chunk)
+            if size > settings.MAX_IMAGE_SIZE:
+                raise ImageDecodeError(f'Размер изображения превышает {settings.MAX_IMAGE_SIZE} байт')
+            digest.update(chunk)
+            tmp.write(chunk)
+        if pending:
+            _decode_chunk(pending)
+        if not size:
+            raise ImageDecodeError('Пустое изображение')
+        if current_name and current_name.rsplit('.', 1)[0] == digest.hexdigest():
+            tmp.close()
+            return DecodedImage(current_name)
+
+        tmp.seek(0)
+        try:
+            with Image.open(tmp) as image:
+                image_format = image.format
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            raise ImageDecodeError('Файл не является изображением')
+        if image_format not in IMAGE_EXTENSIONS:
+            raise ImageDecodeError(f'Формат {image_format} не поддерживается')
+    except BaseException:
+        tmp.close()
+        raise
+    return DecodedImage(f'{digest.hexdigest()}.{IMAGE_EXTENSIONS[image_format]}', tmp)
+
+
+def store_base64_image(data, current_name=None):
+    """Декодирует и сразу сохраняет изображение; возвращает имя файла в хранилище."""
+    return decode_base64_image(data, current_name).save()
+
+
+def _decode_chunk(chunk):
+    try:
+        return base64.b64decode(chunk, validate=True)
+    except (binascii.Error, ValueError):
+        raise ImageDecodeError('Некорректные данные base64')
@@ -0,0 +1,111 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from menu.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса для автодополнения.
+
+    Совпадения по префиксу находятся двоичным поиском и идут раньше совпадений по подстроке,
+    которые добираются запросом icontains к базе. Ответ ограничен INGREDIENT_SEARCH_LIMIT.
+    Изменения из других процессов подхватываются через INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0.0
+
+    def search(self, query):
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        matches = self._prefix_matches(self._get_snapshot(), query, limit)
+        if len(matches) < limit:
+            matches += self._substring_matches(query, matches, limit - len(matches))
+        return matches
+
+    async def asearch(self, query):
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        snapshot = self._snapshot
+        if not self._is_fresh(snapshot):
+            snapshot = await sync_to_async(self._get_snapshot)()
+        matches = self._prefix_matches(snapshot, query, limit)
+        if len(matches) < limit:
+            matches += [item async for item in self._substring_matches(query, matches, limit - len(matches))]
+        return matches
+
+    def _prefix_matches(self, snapshot, query, limit):
+        keys, items = snapshot
+        query = query.casefold()
+        with self._lock:
+            position = bisect_left(keys, (query,))
+            return [items[pk] for key, pk in keys[position:position + limit] if key.startswith(query)]
+
+    @staticmethod
+    def _substring_matches(query, prefix_matches, limit):
+        return Ingredient.objects.filter(name__icontains=query).exclude(
+            pk__in=[item['id'] for item in prefix_matches]
+        ).values('id', 'name', 'measurement_unit')[:limit]
+
+    def add(self, ingredient):
+        with self._lock:
+            if self._snapshot is None:
+                return
+            keys, items = self._snapshot
+            self._discard(keys, items, ingredient.pk)
+            insort(keys, (ingredient.name.casefold(), ingredient.pk))
+            items[ingredient.pk] = {
+                'id': ingredient.pk,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+            }
+
+    def remove(self, pk):
+        with self._lock:
+            if self._snapshot is not None:
+                self._discard(*self._snapshot, pk)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    @staticmethod
+    def _discard(keys, items, pk):
+        removed = items.pop(pk, None)
+        if removed is not None:
+            del keys[bisect_left(keys, (removed['name'].casefold(), pk))]
+
+    def _is_fresh(self, snapshot):
+        return snapshot is not None and time.monotonic() - self._built_at < settings.INGREDIENT_INDEX_TTL
+
+    def _get_snapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        with self._build_lock:
+            current = self._snapshot
+            if current is snapshot or current is None:
+                current = self._build()
+                with self._lock:
+                    self._snapshot = current
+                    self._built_at = time.monotonic()
+            return current
+
+    def _build(self):
+        keys = []
+        items = {}
+        for pk, name, unit in Ingredient.objects.using(DEFAULT_DB_ALIAS).values_list(
+                'id', 'name', 'measurement_unit').iterator():
+            keys.append((name.casefold(), pk))
+            items[pk] = {'id': pk, 'name': name, 'measurement_unit': unit}
+        keys.sort()
+        return keys, items
+
+
+ingredient_index = IngredientIndex()
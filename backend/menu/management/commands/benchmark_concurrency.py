@@ -0,0 +1,312 @@
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from menu.management.commands.benchmark_endpoints import PERCENTILES, percentile
+from menu.management.commands.stress_sqlite import apply_profile
+from menu.models import Ingredient, Recipe, ShortLink
+
+User = get_user_model()
+
+HOST = '127.0.0.1'
+BACKLOG = 4096
+
+
+def server_command(server, port, options):
+    if server == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'myproject.wsgi:application', '--bind', f'{HOST}:{port}',
+                '--workers', str(options['workers']), '--worker-class', 'gthread',
+                '--threads', str(options['threads']), '--worker-connections', str(options['connections'] * 2),
+                '--backlog', str(BACKLOG), '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'myproject.asgi:application', '--host', HOST, '--port', str(port),
+            '--workers', str(options['workers']), '--backlog', str(BACKLOG), '--no-access-log',
+            '--log-level', 'warning']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid):
+    """pid и все его потомки по /proc."""
+    pids = [pid]
+    for current in pids:
+        try:
+            pids.extend(int(child) for child in Path(f'/proc/{current}/task/{current}/children').read_text().split())
+        except OSError:
+            pass
+    return pids
+
+
+def tree_usage(pid):
+    """Суммарные число потоков и RSS в МиБ процесса сервера вместе с воркерами."""
+    threads = rss = 0
+    for current in process_tree(pid):
+        try:
+            status = Path(f'/proc/{current}/status').read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('Threads:'):
+                threads += int(line.split()[1])
+            elif line.startswith('VmRSS:'):
+                rss += int(line.split()[1])
+    return threads, rss / 1024
+
+
+async def read_response(reader):
+    """Статус ответа HTTP/1.1 и признак keep-alive; тело читается и отбрасывается."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if headers.get('transfer-encoding') == 'chunked':
+        while size := int((await reader.readuntil(b'\r\n')).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readuntil(b'\r\n')
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection') != 'close'
+
+
+async def client(port, requests, measure_from, deadline, timeout, rng, result):
+    """Одно соединение keep-alive, отправляющее запросы подряд до deadline.
+
+    Закрытие сервером простаивающего соединения ошибкой не считается: запрос повторяется по новому.
+    """
+    reader = writer = None
+    while time.monotonic() < deadline:
+        request = rng.choice(requests)
+        started = time.monotonic()
+        for _ in range(2):
+            reused = writer is not None
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+                    result['connects'] += 1
+                writer.write(request)
+                status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                    ValueError, IndexError) as error:
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                if reused and not isinstance(error, asyncio.TimeoutError):
+                    continue
+                if time.monotonic() >= measure_from:
+                    result['errors'][type(error).__name__] += 1
+                break
+            if started >= measure_from:
+                result['latencies'].append(time.monotonic() - started)
+                result['statuses'][status] += 1
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+            break
+    if writer is not None:
+        writer.close()
+
+
+async def sample_usage(pid, deadline, result):
+    while time.monotonic() < deadline:
+        threads, rss = tree_usage(pid)
+        result['peak_threads'] = max(result['peak_threads'], threads)
+        result['peak_rss_mb'] = max(result['peak_rss_mb'], rss)
+        await asyncio.sleep(0.5)
+
+
+async def run_load(pid, port, requests, options):
+    measure_from = time.monotonic() + options['warmup']
+    deadline = measure_from + options['duration']
+    result = {
+        'latencies': [], 'statuses': Counter(), 'errors': Counter(), 'connects': 0,
+        'peak_threads': 0, 'peak_rss_mb': 0.0,
+    }
+    tasks = [
+        client(port, requests, measure_from, deadline, options['timeout'], random.Random(options['seed'] + number),
+               result)
+        for number in range(options['connections'])
+    ]
+    await asyncio.gather(sample_usage(pid, deadline, result), *tasks)
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Запускает API под gunicorn (WSGI, потоки) и uvicorn (ASGI, асинхронные представления чтения) '
+            'на копии сгенерированной SQLite-базы и сравнивает пропускную способность и задержки '
+            'при большом числе одновременных соединений keep-alive.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help='Число одновременных соединений')
+        parser.add_argument('--duration', type=float, default=20, help='Длительность замера на сервер, с')
+        parser.add_argument('--warmup', type=float, default=5, help='Прогрев перед замером, с')
+        parser.add_argument('--timeout', type=float, default=30, help='Таймаут одного запроса, с')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Процессов на сервер')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков в процессе gunicorn')
+        parser.add_argument('--servers', nargs='+', choices=('wsgi', 'asgi'), default=['wsgi', 'asgi'],
+                            help='Сравниваемые серверы')
+        parser.add_argument('--auth-ratio', type=float, default=0.5,
+                            help='Доля запросов с токеном; ответы анонимам кэшируются целиком')
+        parser.add_argument('--profile', default='production', help='Профиль SQLITE_PROFILES серверов')
+        parser.add_argument('--users', type=int, default=200, help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=5000, help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=500, help='Количество ингредиентов')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='benchmark_concurrency.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда предназначена только для SQLite')
+        if options['profile'] not in settings.SQLITE_PROFILES:
+            raise CommandError(f'Неизвестный профиль: {options["profile"]}')
+        if options['connections'] < 1 or options['duration'] <= 0 or options['workers'] < 1:
+            raise CommandError('--connections, --duration и --workers должны быть положительными')
+        if not 0 <= options['auth_ratio'] <= 1:
+            raise CommandError('--auth-ratio должен быть от 0 до 1')
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        needed = options['connections'] * 2 + 256
+        if hard != resource.RLIM_INFINITY and hard < needed:
+            raise CommandError(f'Лимит открытых файлов {hard} меньше нужных {needed}; увеличьте ulimit -n')
+        resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, needed), hard))
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(MEDIA_ROOT=directory):
+            path = str(Path(directory) / 'benchmark.sqlite3')
+            paths = self._prepare(path, options)
+            results = {}
+            for server in options['servers']:
+                results[server] = self._run(server, path, paths, directory, options)
+
+        report = {
+            'dataset': {name: options[name] for name in ('users', 'recipes', 'ingredients', 'seed')},
+            'connections': options['connections'],
+            'duration_s': options['duration'],
+            'workers': options['workers'],
+            'threads': options['threads'],
+            'auth_ratio': options['auth_ratio'],
+            'profile': options['profile'],
+            'cpu_count': os.cpu_count(),
+            'servers': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n',
+                                           encoding='utf-8')
+        for server, result in results.items():
+            self.stdout.write(
+                f'{server:5} {result["requests_per_second"]:8.1f} запр/с  '
+                + '  '.join(f'p{rank} {result[f"p{rank}_ms"]:8.1f} мс' for rank in PERCENTILES)
+                + f'  ошибок {sum(result["errors"].values())}  потоков {result["peak_threads"]}'
+                  f'  RSS {result["peak_rss_mb"]:.0f} МиБ'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    def _prepare(self, path, options):
+        """Создаёт базу с данными и возвращает пары (путь, заголовок Authorization или None)."""
+        original = dict(connection.settings_dict)
+        apply_profile(path, settings.SQLITE_PROFILES['development'])
+        try:
+            call_command('migrate', verbosity=0)
+            call_command('generate_fake_data', stdout=io.StringIO(), users=options['users'],
+                         recipes=options['recipes'], ingredients=options['ingredients'], seed=options['seed'])
+            rng = random.Random(options['seed'])
+            recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+            sampled = rng.sample(recipe_ids, min(len(recipe_ids), 200))
+            links = [ShortLink.objects.get_or_create(recipe_id=pk)[0].pk for pk in sampled[:50]]
+            names = list(Ingredient.objects.values_list('name', flat=True)[:100])
+            tokens = [Token.objects.get_or_create(user=user)[0].key
+                      for user in User.objects.order_by('id')[:50]]
+        finally:
+            connections.close_all()
+            connection.settings_dict.update(original)
+        anonymous = [
+            *(f'/api/recipes/?limit=10&page={page}' for page in range(1, 6)),
+            *(f'/api/recipes/{pk}/' for pk in sampled),
+            *(f'/api/ingredients/?name={name[:rng.randint(2, len(name))]}' for name in names),
+            *(f'/s/{pk}' for pk in links),
+        ]
+        authenticated = [
+            *(f'/api/recipes/?limit=10&page={page}' for page in range(1, 6)),
+            *(f'/api/recipes/{pk}/' for pk in sampled),
+            '/api/recipes/?is_favorited=1', '/api/recipes/?is_in_shopping_cart=1',
+        ]
+        return [
+            (rng.choice(authenticated), f'Token {rng.choice(tokens)}')
+            if rng.random() < options['auth_ratio'] else (rng.choice(anonymous), None)
+            for _ in range(2000)
+        ]
+
+    def _run(self, server, path, paths, directory, options):
+        port = free_port()
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'myproject.settings', 'DB_NAME': path,
+               'SQLITE_PROFILE': options['profile'], 'PYTHONPATH': str(settings.BASE_DIR)}
+        env.pop('ASYNC_READ_VIEWS', None)
+        requests = [
+            (f'GET {quote(url, safe="/?&=")} HTTP/1.1\r\nHost: {HOST}:{port}\r\nAccept: application/json\r\n'
+             + (f'Authorization: {auth}\r\n' if auth else '') + '\r\n').encode()
+            for url, auth in paths
+        ]
+        with open(Path(directory) / f'{server}.log', 'wb') as log:
+            process = subprocess.Popen(server_command(server, port, options), cwd=settings.BASE_DIR, env=env,
+                                       stdout=log, stderr=subprocess.STDOUT)
+            try:
+                self._wait_ready(process, port)
+                result = asyncio.run(run_load(process.pid, port, requests, options))
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        latencies = result['latencies']
+        return {
+            'requests': len(latencies),
+            'requests_per_second': round(len(latencies) / options['duration'], 1),
+            **{f'p{rank}_ms': round(percentile(latencies, rank) * 1000, 1) if latencies else 0.0
+               for rank in PERCENTILES},
+            'statuses': {str(status): count for status, count in sorted(result['statuses'].items())},
+            'errors': dict(result['errors']),
+            'connects': result['connects'],
+            'peak_threads': result['peak_threads'],
+            'peak_rss_mb': round(result['peak_rss_mb'], 1),
+        }
+
+    @staticmethod
+    def _wait_ready(process, port, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'Сервер завершился с кодом {process.returncode}')
+            try:
+                with socket.create_connection((HOST, port), timeout=1) as sock:
+                    sock.sendall(f'GET /api/ingredients/?name=a HTTP/1.1\r\nHost: {HOST}:{port}\r\n'
+                                 f'Connection: close\r\n\r\n'.encode())
+                    if sock.recv(16).startswith(b'HTTP/1.1 200'):
+                        return
+            except OSError:
+                pass
+            time.sleep(0.3)
+        raise CommandError('Сервер не ответил за отведённое время')
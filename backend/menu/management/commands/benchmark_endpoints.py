@@ -0,0 +1,271 @@
+import io
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import get_resolver, reverse
+from rest_framework.authtoken.models import Token
+
+from menu.ingredient_index import ingredient_index
+from menu.management.commands.generate_fake_data import placeholder_image
+from menu.models import Recipe, ShortLink
+from menu.recipe_ingredient_index import recipe_ingredient_index
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+DATASET_OPTIONS = ('users', 'recipes', 'ingredients', 'ingredients_per_recipe',
+                   'favorites', 'shopping_cart', 'subscriptions', 'seed')
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark-endpoints',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    }
+}
+
+
+def percentile(samples, rank):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def throughput(client, paths, requests):
+    """Обходит paths по кругу requests раз и возвращает запросы в секунду и SQL-запросы на запрос."""
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        started = time.perf_counter()
+        for number in range(requests):
+            client.get(paths[number % len(paths)])
+        elapsed = time.perf_counter() - started
+    return {
+        'requests_per_second': round(requests / elapsed),
+        'queries_per_request': round(len(executed) / requests, 3),
+    }
+
+
+class Case:
+    """Один замеряемый запрос.
+
+    setup и undo(response) выполняются вне замера и возвращают данные в исходное состояние.
+    """
+
+    def __init__(self, name, client, method, url, data=None, setup=None, undo=None):
+        self.name = name
+        self.client = client
+        self.method = method
+        self.url = url
+        self.data = data
+        self.setup = setup
+        self.undo = undo
+
+    def request(self):
+        send = getattr(self.client, self.method.lower())
+        if self.data is None:
+            return send(self.url)
+        return send(self.url, json.dumps(self.data), content_type='application/json')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку, число SQL-запросов и размер ответа всех маршрутов API '
+            'на сгенерированном наборе данных во временной тестовой базе и сохраняет отчёт в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=2000, help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=500, help='Количество ингредиентов')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6,
+                            help='Количество ингредиентов в рецепте')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных рецептов у пользователя')
+        parser.add_argument('--shopping-cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--repeat', type=int, default=30, help='Количество замеров каждого запроса')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора данных')
+        parser.add_argument('--output', default='benchmark.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'recipes', 'ingredients', 'ingredients_per_recipe', 'repeat'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} должен быть положительным')
+        if options['ingredients_per_recipe'] > options['ingredients']:
+            raise CommandError('--ingredients-per-recipe не может превышать --ingredients')
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                    MEDIA_ROOT=media_root, CACHES=BENCHMARK_CACHES, SHARED_CACHE=True, ALLOWED_HOSTS=['*']):
+                self._reset_indexes()
+                self._seed(options)
+                results = self._run(self._cases(), options['repeat'])
+        finally:
+            self._reset_indexes()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        dataset = {name: options[name] for name in DATASET_OPTIONS}
+        report = {
+            'dataset': dataset,
+            'repeat': options['repeat'],
+            'endpoints': results,
+            'uncovered_routes': self._uncovered_routes(results),
+        }
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n',
+                                           encoding='utf-8')
+        for name, result in results.items():
+            self.stdout.write(f'{name:45} p50 {result["p50_ms"]:8.2f} мс  p95 {result["p95_ms"]:8.2f} мс  '
+                              f'p99 {result["p99_ms"]:8.2f} мс  SQL {result["queries"]:3}  {result["bytes"]} Б')
+        if report['uncovered_routes']:
+            self.stderr.write('Маршруты без замеров: ' + ', '.join(report['uncovered_routes']))
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    @staticmethod
+    def _reset_indexes():
+        ingredient_index.invalidate()
+        recipe_ingredient_index.invalidate()
+
+    def _seed(self, options):
+        call_command('generate_fake_data', stdout=io.StringIO(),
+                     **{name: options[name] for name in DATASET_OPTIONS})
+
+    def _cases(self):
+        user = User.objects.order_by('id').first()
+        other = User.objects.exclude(pk=user.pk).exclude(sub_to__sender=user).order_by('id').first()
+        recipe = Recipe.objects.order_by('id').first()
+        fresh = Recipe.objects.exclude(favorites__user=user).exclude(shopping_cart_recipe__user=user).order_by('id')
+        fresh_recipe, batch = fresh[0], [item.pk for item in fresh[1:6]]
+        ingredient_ids = list(recipe.recipe_ingredients.values_list('ingredient_id', flat=True))
+        link, _ = ShortLink.objects.get_or_create(recipe=recipe)
+
+        anon = Client()
+        client = Client(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        recipe_data = {
+            'name': 'борщ домашний', 'text': 'суп', 'cooking_time': 30, 'image': placeholder_image(),
+            'ingredients': [{'id': pk, 'amount': 10} for pk in ingredient_ids],
+        }
+        user.set_password('benchmark-password')
+        user.save(update_fields=['password'])
+        login_data = {'email': user.email, 'password': 'benchmark-password'}
+        logout_key = 'b' * 40
+        logout_client = Client(HTTP_AUTHORIZATION=f'Token {logout_key}')
+
+        def request(method, url, data=None):
+            return lambda *args: Case('', client, method, url, data).request()
+
+        return [
+            Case('recipes-list', anon, 'GET', '/api/recipes/'),
+            Case('recipes-list [auth]', client, 'GET', '/api/recipes/'),
+            Case('recipes-list ?page', client, 'GET', '/api/recipes/?page=5&limit=6'),
+            Case('recipes-list ?author', client, 'GET', f'/api/recipes/?author={recipe.author_id}'),
+            Case('recipes-list ?is_favorited', client, 'GET', '/api/recipes/?is_favorited=1'),
+            Case('recipes-list ?is_in_shopping_cart', client, 'GET', '/api/recipes/?is_in_shopping_cart=1'),
+            Case('recipes-list ?search', client, 'GET', '/api/recipes/?search=борщ'),
+            Case('recipes-list ?cursor', client, 'GET', '/api/recipes/?cursor='),
+            Case('recipes-list POST', client, 'POST', '/api/recipes/', recipe_data,
+                 undo=lambda response: Recipe.objects.filter(pk=response.json()['id']).delete()),
+            Case('recipes-detail', anon, 'GET', f'/api/recipes/{recipe.pk}/'),
+            Case('recipes-detail [auth]', client, 'GET', f'/api/recipes/{recipe.pk}/'),
+            Case('recipes-detail PATCH', client, 'PATCH', f'/api/recipes/{self._own_recipe(user)}/', recipe_data),
+            Case('recipes-get-link', client, 'GET', f'/api/recipes/{recipe.pk}/get-link/'),
+            Case('recipes-favorite POST', client, 'POST', f'/api/recipes/{fresh_recipe.pk}/favorite/',
+                 undo=request('DELETE', f'/api/recipes/{fresh_recipe.pk}/favorite/')),
+            Case('recipes-favorite DELETE', client, 'DELETE', f'/api/recipes/{fresh_recipe.pk}/favorite/',
+                 setup=request('POST', f'/api/recipes/{fresh_recipe.pk}/favorite/')),
+            Case('recipes-shopping-cart POST', client, 'POST', f'/api/recipes/{fresh_recipe.pk}/shopping_cart/',
+                 undo=request('DELETE', f'/api/recipes/{fresh_recipe.pk}/shopping_cart/')),
+            Case('recipes-shopping-cart DELETE', client, 'DELETE', f'/api/recipes/{fresh_recipe.pk}/shopping_cart/',
+                 setup=request('POST', f'/api/recipes/{fresh_recipe.pk}/shopping_cart/')),
+            Case('recipes-favorite-batch POST', client, 'POST', '/api/recipes/favorite/', {'recipes': batch},
+                 undo=request('DELETE', '/api/recipes/favorite/', {'recipes': batch})),
+            Case('recipes-shopping-cart-batch POST', client, 'POST', '/api/recipes/shopping_cart/',
+                 {'recipes': batch}, undo=request('DELETE', '/api/recipes/shopping_cart/', {'recipes': batch})),
+            Case('recipes-from-ingredients', anon, 'GET',
+                 f'/api/recipes/from_ingredients/?ingredients={",".join(map(str, ingredient_ids))}'),
+            Case('recipes-download-shopping-cart', client, 'GET', '/api/recipes/download_shopping_cart/'),
+            Case('short-link', anon, 'GET', f'/s/{link.pk}'),
+            Case('users-list', anon, 'GET', '/api/users/'),
+            Case('users-list POST', anon, 'POST', '/api/users/', {
+                'email': 'new-user@example.com', 'username': 'new-user', 'first_name': 'Имя',
+                'last_name': 'Фамилия', 'password': 'benchmark-password'},
+                 undo=lambda response: User.objects.filter(pk=response.json()['id']).delete()),
+            Case('users-detail', client, 'GET', f'/api/users/{other.pk}/'),
+            Case('users-me', client, 'GET', '/api/users/me/'),
+            Case('users-me-avatar PUT', client, 'PUT', '/api/users/me/avatar/', {'avatar': placeholder_image()}),
+            Case('users-subscriptions', client, 'GET', '/api/users/subscriptions/?recipes_limit=3'),
+            Case('users-subscribe POST', client, 'POST', f'/api/users/{other.pk}/subscribe/',
+                 undo=request('DELETE', f'/api/users/{other.pk}/subscribe/')),
+            Case('users-set-password', client, 'POST', '/api/users/set_password/',
+                 {'current_password': 'benchmark-password', 'new_password': 'benchmark-password'}),
+            Case('users-set-username', client, 'POST', reverse('users-set-username'),
+                 {'current_password': 'benchmark-password', f'new_{User.USERNAME_FIELD}': 'renamed@example.com'},
+                 undo=lambda response: User.objects.filter(pk=user.pk).update(
+                     **{User.USERNAME_FIELD: getattr(user, User.USERNAME_FIELD)})),
+            Case('login', anon, 'POST', '/api/auth/token/login/', login_data),
+            Case('logout', logout_client, 'POST', '/api/auth/token/logout/',
+                 setup=lambda: Token.objects.get_or_create(user=other, defaults={'key': logout_key})),
+            Case('ingredient-list', anon, 'GET', '/api/ingredients/'),
+            Case('ingredient-list ?name', anon, 'GET', '/api/ingredients/?name=ингр'),
+            Case('ingredient-detail', anon, 'GET', f'/api/ingredients/{ingredient_ids[0]}/'),
+        ]
+
+    @staticmethod
+    def _own_recipe(user):
+        return Recipe.objects.filter(author=user).values_list('pk', flat=True).first() or Recipe.objects.create(
+            author=user, name='борщ', text='суп', cooking_time=30, image='placeholder.png').pk
+
+    def _run(self, cases, repeat):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        results = {}
+        for case in cases:
+            latencies = []
+            counts = []
+            for attempt in range(repeat + 1):
+                if case.setup:
+                    case.setup()
+                queries = 0
+                with connection.execute_wrapper(count):
+                    started = time.perf_counter()
+                    response = case.request()
+                    body = b''.join(response.streaming_content) if response.streaming else response.content
+                    elapsed = time.perf_counter() - started
+                if response.status_code >= 400:
+                    raise CommandError(f'{case.name}: {case.method} {case.url} вернул {response.status_code}')
+                if case.undo:
+                    case.undo(response)
+                if attempt:
+                    latencies.append(elapsed * 1000)
+                    counts.append(queries)
+            results[case.name] = {
+                'method': case.method,
+                'status': response.status_code,
+                'queries': max(counts),
+                'bytes': len(body),
+                **{f'p{rank}_ms': round(percentile(latencies, rank), 3) for rank in PERCENTILES},
+            }
+        return results
+
+    @staticmethod
+    def _uncovered_routes(results):
+        covered = {name.split(' ')[0] for name in results}
+        routes = {name for name in get_resolver().reverse_dict if isinstance(name, str)}
+        return sorted(routes - covered - {'api-root'})
@@ -0,0 +1,121 @@
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from menu.ingredient_index import ingredient_index
+from menu.management.commands.benchmark_endpoints import percentile
+from menu.models import Ingredient
+from menu.views import IngredientFilter
+
+WORDS = ('картофель', 'морковь', 'лук', 'соль', 'сахар', 'мука', 'масло', 'молоко', 'сыр', 'томат',
+         'перец', 'рис', 'гречка', 'яблоко', 'курица', 'говядина', 'свинина', 'капуста', 'чеснок', 'укроп')
+ADJECTIVES = ('свежий', 'сушёный', 'молотый', 'копчёный', 'жареный', 'варёный', 'тёртый', 'консервированный')
+UNITS = ('г', 'кг', 'мл', 'л', 'шт')
+QUERIES = {
+    'короткий префикс': 'м',
+    'префикс': 'молоко',
+    'подстрока': 'тёртый',
+    'нет совпадений': 'ананас',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает автодополнение ингредиентов через индекс в памяти с прежним фильтром '
+            'name__icontains на синтетических каталогах разного размера во временной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 100000, 1000000],
+                            help='Количество ингредиентов в каталогах')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров каждого запроса')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='benchmark_ingredient_search.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        if sizes[0] < 1 or options['repeat'] < 1:
+            raise CommandError('--sizes и --repeat должны быть положительными')
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(Path(directory) / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False):
+                    results = [self._measure(size, options) for size in sizes]
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                ingredient_index.invalidate()
+
+        report = {'limit': settings.INGREDIENT_SEARCH_LIMIT, 'repeat': options['repeat'], 'results': results}
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        for result in results:
+            self.stdout.write(f'{result["ingredients"]:>8} ингредиентов: построение индекса '
+                              f'{result["build_seconds"]:.2f} с, add {result["add_ms"]:.3f} мс, '
+                              f'remove {result["remove_ms"]:.3f} мс')
+            for name, query in result['queries'].items():
+                self.stdout.write(f'    {name:18} icontains {query["icontains_ms"]:9.2f} мс '
+                                  f'({query["icontains_rows"]:>7})   индекс {query["index_ms"]:9.2f} мс '
+                                  f'({query["index_rows"]:>3})')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    def _measure(self, size, options):
+        Ingredient.objects.all().delete()
+        self._fill(size, options['seed'])
+        ingredient_index.invalidate()
+        started = time.perf_counter()
+        ingredient_index.search('')
+        build_seconds = time.perf_counter() - started
+
+        queries = {}
+        exact = Ingredient.objects.order_by('pk').values_list('name', flat=True)[size // 2]
+        for name, query in {**QUERIES, 'точное название': exact}.items():
+            icontains = self._time(lambda: list(
+                IngredientFilter({'name': query}, queryset=Ingredient.objects.all()).qs.values(
+                    'id', 'name', 'measurement_unit')), options['repeat'])
+            index = self._time(lambda: ingredient_index.search(query), options['repeat'])
+            queries[name] = {
+                'query': query,
+                'icontains_ms': icontains[0],
+                'icontains_rows': len(icontains[1]),
+                'index_ms': index[0],
+                'index_rows': len(index[1]),
+            }
+
+        ingredient = Ingredient.objects.create(name='ананас консервированный', measurement_unit='г')
+        add_ms = self._time(lambda: ingredient_index.add(ingredient), options['repeat'])[0]
+        remove_ms = self._time(lambda: ingredient_index.remove(ingredient.pk), options['repeat'])[0]
+        return {
+            'ingredients': size,
+            'build_seconds': round(build_seconds, 3),
+            'add_ms': add_ms,
+            'remove_ms': remove_ms,
+            'queries': queries,
+        }
+
+    @staticmethod
+    def _fill(size, seed):
+        rng = random.Random(seed)
+        batch = []
+        for number in range(size):
+            name = f'{rng.choice(WORDS)} {rng.choice(ADJECTIVES)} {number}'
+            batch.append(Ingredient(name=name, measurement_unit=rng.choice(UNITS)))
+            if len(batch) == 5000:
+                Ingredient.objects.bulk_create(batch)
+                batch = []
+        Ingredient.objects.bulk_create(batch)
+
+    @staticmethod
+    def _time(function, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            samples.append(time.perf_counter() - started)
+        return round(percentile(samples, 50) * 1000, 3), result
@@ -0,0 +1,112 @@
+import csv
+import io
+import json
+import random
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from menu.bulk import delete_by_pk
+from menu.models import Ingredient
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт', 'ст. л.', 'ч. л.', 'по вкусу')
+LINEAR_TOLERANCE = 1.5
+
+
+class Command(BaseCommand):
+    help = ('Загружает командой load_ingredients синтетические каталоги разного размера во временную '
+            'тестовую базу с DEBUG=False и сравнивает время на строку и память процесса, проверяя линейный рост.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Количество строк в каталогах')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv', help='Формат каталогов')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Количество строк в одном INSERT')
+        parser.add_argument('--duplicates', type=float, default=0.1,
+                            help='Доля строк, повторяющих уже встречавшиеся ингредиенты')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='benchmark_load_ingredients.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        if sizes[0] < 1:
+            raise CommandError('--sizes должны быть положительными')
+        if not 0 <= options['duplicates'] < 1:
+            raise CommandError('--duplicates должен быть в диапазоне [0, 1)')
+
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(directory / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False):
+                    results = [self._measure(directory, size, options) for size in sizes]
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        slowdown = results[-1]['us_per_row'] / results[0]['us_per_row']
+        report = {
+            'format': options['format'],
+            'batch_size': options['batch_size'],
+            'duplicates': options['duplicates'],
+            'results': results,
+            'slowdown': round(slowdown, 2),
+        }
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        for result in results:
+            self.stdout.write(f'{result["rows"]:>10} строк  {result["seconds"]:8.2f} с  '
+                              f'{result["rows_per_second"]:>8} строк/с  {result["us_per_row"]:6.1f} мкс/строку  '
+                              f'создано {result["created"]:>10}  RSS {result["max_rss_mb"]:.0f} МиБ')
+        message = (f'Время на строку для {sizes[-1]} строк в {slowdown:.2f} раза больше, '
+                   f'чем для {sizes[0]}; отчёт сохранён в {options["output"]}')
+        if slowdown > LINEAR_TOLERANCE:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def _measure(self, directory, size, options):
+        path = directory / f'ingredients-{size}.{options["format"]}'
+        unique = self._write_catalog(path, size, options)
+        delete_by_pk(Ingredient, Ingredient.objects.values_list('pk', flat=True))
+        started = time.perf_counter()
+        call_command('load_ingredients', str(path), batch_size=options['batch_size'], stdout=io.StringIO())
+        seconds = time.perf_counter() - started
+        created = Ingredient.objects.count()
+        if created != unique:
+            raise CommandError(f'Загружено {created} ингредиентов вместо {unique}')
+        path.unlink()
+        return {
+            'rows': size,
+            'created': created,
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(size / seconds),
+            'us_per_row': round(seconds / size * 10 ** 6, 2),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    @staticmethod
+    def _write_catalog(path, size, options):
+        """Пишет каталог из size строк и возвращает число уникальных пар (название, единица)."""
+        rng = random.Random(options['seed'])
+        unique = 0
+        with path.open('w', encoding='utf-8', newline='') as target:
+            writer = csv.writer(target)
+            for _ in range(size):
+                if unique and rng.random() < options['duplicates']:
+                    number = rng.randrange(unique)
+                else:
+                    number = unique
+                    unique += 1
+                name, unit = f'ингредиент {number}', UNITS[number % len(UNITS)]
+                if options['format'] == 'csv':
+                    writer.writerow((name, unit))
+                else:
+                    target.write(json.dumps({'name': name, 'measurement_unit': unit}, ensure_ascii=False) + '\n')
+        return unique
@@ -0,0 +1,100 @@
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from menu.management.commands.benchmark_endpoints import BENCHMARK_CACHES, percentile
+from menu.models import Recipe
+from menu.views import RecipeCursorPagination
+
+User = get_user_model()
+
+BASE_PUB_DATE = datetime(2024, 1, 1)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку страниц списка рецептов по номеру (?page=) и по курсору (?cursor=) '
+            'на первой и дальних страницах во временной базе с заданным числом рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000, help='Количество рецептов')
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 10000], help='Замеряемые страницы')
+        parser.add_argument('--limit', type=int, default=6, help='Размер страницы')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров каждой страницы')
+        parser.add_argument('--output', default='benchmark_pagination.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        if min(options['recipes'], options['limit'], options['repeat'], *options['pages']) < 1:
+            raise CommandError('Все параметры должны быть положительными')
+        if (max(options['pages']) - 1) * options['limit'] >= options['recipes']:
+            raise CommandError('Самая дальняя страница выходит за пределы --recipes')
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(Path(directory) / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False, CACHES=BENCHMARK_CACHES, SHARED_CACHE=False,
+                                       ALLOWED_HOSTS=['*']):
+                    self._seed(options['recipes'])
+                    results = [self._measure(page, options) for page in sorted(options['pages'])]
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {'recipes': options['recipes'], 'limit': options['limit'], 'repeat': options['repeat'],
+                  'results': results}
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        for result in results:
+            self.stdout.write(f'страница {result["page"]:>7}  ?page= {result["page_ms"]:9.2f} мс  '
+                              f'?cursor= {result["cursor_ms"]:7.2f} мс')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    @staticmethod
+    def _seed(count):
+        author = User.objects.create_user(email='pages@example.com', username='pages', password='password')
+        for start in range(0, count, 5000):
+            Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'рецепт {number}', text='описание', image='recipes/benchmark.png',
+                       cooking_time=10)
+                for number in range(start, min(start + 5000, count))
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Recipe._meta.db_table} SET pub_date = "
+                f"strftime('%%Y-%%m-%%d %%H:%%M:%%S', %s, '+' || (id / 3) || ' minutes')",
+                [BASE_PUB_DATE.strftime('%Y-%m-%d %H:%M:%S')],
+            )
+            cursor.execute('ANALYZE')
+
+    def _measure(self, page, options):
+        limit = options['limit']
+        cursor = ''
+        if page > 1:
+            before = Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'pub_date', 'pk', named=True)[(page - 1) * limit - 1]
+            cursor = RecipeCursorPagination().encode_cursor(before)
+        by_number = self._time(f'/api/recipes/?page={page}&limit={limit}', options['repeat'])
+        by_cursor = self._time(f'/api/recipes/?cursor={cursor}&limit={limit}', options['repeat'])
+        if by_number[1] != by_cursor[1]:
+            raise CommandError(f'Страница {page} по номеру и по курсору различается')
+        return {'page': page, 'page_ms': by_number[0], 'cursor_ms': by_cursor[0]}
+
+    @staticmethod
+    def _time(url, repeat):
+        client = Client()
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: статус {response.status_code}')
+        ids = [recipe['id'] for recipe in response.json()['results']]
+        return round(percentile(samples, 50) * 1000, 2), ids
@@ -0,0 +1,132 @@
+import json
+import random
+import tempfile
+import time
+from itertools import accumulate
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, F, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast
+from django.test.utils import override_settings
+
+from menu.management.commands.benchmark_endpoints import percentile
+from menu.models import Ingredient, Recipe, RecipeIngredient
+from menu.recipe_ingredient_index import RecipeIngredientIndex
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+
+def match_in_sql(ingredient_ids, limit):
+    """Тот же отбор и порядок, что у RecipeIngredientIndex.match, одним запросом с GROUP BY."""
+    totals = RecipeIngredient.objects.filter(recipe_id=OuterRef('recipe_id')).order_by().values(
+        'recipe_id').annotate(total=Count('pk')).values('total')
+    return list(
+        RecipeIngredient.objects.filter(ingredient_id__in=set(ingredient_ids)).order_by().values('recipe_id')
+        .annotate(found=Count('pk'), total=Subquery(totals))
+        .annotate(share=Cast('found', FloatField()) / F('total'), missing=F('total') - F('found'))
+        .order_by('-share', 'missing', '-recipe_id')
+        .values_list('recipe_id', 'found', 'total')[:limit]
+    )
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает подбор рецептов по имеющимся ингредиентам (/api/recipes/from_ingredients/) '
+            'через индекс в памяти с SQL-запросом GROUP BY recipe_id во временной базе '
+            'со степенным распределением популярности ингредиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000, help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=2000, help='Количество ингредиентов')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=7,
+                            help='Количество ингредиентов в рецепте')
+        parser.add_argument('--limit', type=int, default=8, help='Количество рецептов в ответе')
+        parser.add_argument('--repeat', type=int, default=3, help='Количество замеров каждого запроса')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='benchmark_recipe_matching.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        for name in ('recipes', 'ingredients', 'ingredients_per_recipe', 'limit', 'repeat'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} должен быть положительным')
+        if options['ingredients_per_recipe'] > options['ingredients']:
+            raise CommandError('--ingredients-per-recipe больше --ingredients')
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(Path(directory) / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False):
+                    ingredient_ids = self._seed(options)
+                    results = self._measure(ingredient_ids, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {name: options[name] for name in ('recipes', 'ingredients', 'ingredients_per_recipe',
+                                                   'limit', 'repeat', 'seed')}
+        report['results'] = results
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        self.stdout.write(f'построение индекса {results["build_seconds"]:.2f} с')
+        for name, query in results['queries'].items():
+            self.stdout.write(f'    {name:20} индекс {query["index_ms"]:8.2f} мс   SQL {query["sql_ms"]:9.2f} мс')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    @staticmethod
+    def _seed(options):
+        rng = random.Random(options['seed'])
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г') for number in range(options['ingredients'])
+        )
+        ingredient_ids = [ingredient.pk for ingredient in ingredients]
+        weights = list(accumulate(1 / rank for rank in range(1, len(ingredient_ids) + 1)))
+        author = User.objects.create_user(email='matching@example.com', username='matching', password='password')
+        for start in range(0, options['recipes'], BATCH_SIZE):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'рецепт {number}', text='описание', image='recipes/benchmark.png',
+                       cooking_time=10)
+                for number in range(start, min(start + BATCH_SIZE, options['recipes']))
+            )
+            rows = []
+            for recipe in recipes:
+                chosen = set()
+                while len(chosen) < options['ingredients_per_recipe']:
+                    chosen.add(rng.choices(ingredient_ids, cum_weights=weights)[0])
+                rows += [RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=1) for pk in chosen]
+            RecipeIngredient.objects.bulk_create(rows)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return ingredient_ids
+
+    def _measure(self, ingredient_ids, options):
+        index = RecipeIngredientIndex()
+        started = time.perf_counter()
+        index.match([], 1)
+        build_seconds = time.perf_counter() - started
+
+        queries = {
+            'редкие ингредиенты': ingredient_ids[-3:],
+            'частые ингредиенты': ingredient_ids[:3],
+            'кладовая из 20': ingredient_ids[:20],
+        }
+        results = {}
+        for name, query in queries.items():
+            by_index = self._time(lambda: index.match(query, options['limit']), options['repeat'])
+            by_sql = self._time(lambda: match_in_sql(query, options['limit']), options['repeat'])
+            if list(by_index[1]) != [tuple(row) for row in by_sql[1]]:
+                raise CommandError(f'{name}: индекс и SQL вернули разные рецепты')
+            results[name] = {'ingredient_ids': query, 'index_ms': by_index[0], 'sql_ms': by_sql[0]}
+        return {'build_seconds': round(build_seconds, 3), 'queries': results}
+
+    @staticmethod
+    def _time(function, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            samples.append(time.perf_counter() - started)
+        return round(percentile(samples, 50) * 1000, 2), result
@@ -0,0 +1,117 @@
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from menu.management.commands.benchmark_endpoints import percentile
+from menu.models import Recipe
+from menu.search import SearchBackend, SQLiteSearchBackend
+
+User = get_user_model()
+
+DISHES = ('суп', 'салат', 'пирог', 'картошка', 'каша', 'омлет', 'плов', 'рагу', 'запеканка', 'котлеты',
+          'блины', 'борщ', 'паста', 'жаркое', 'оладьи', 'голубцы')
+ADJECTIVES = ('грибной', 'куриный', 'овощной', 'домашний', 'жареный', 'печёный', 'сырный', 'рыбный',
+              'постный', 'быстрый')
+TEXT_WORDS = ('нарезать', 'обжарить', 'добавить', 'посолить', 'перемешать', 'варить', 'минут', 'лук',
+              'морковь', 'грибы', 'сметану', 'картошку', 'зелень', 'масло', 'подавать', 'горячим', 'тесто',
+              'духовке', 'сковороде', 'кастрюле')
+QUERIES = {
+    'слово': 'пирог',
+    'словоформа': 'картошки',
+    'два слова': 'грибной суп',
+    'частое слово': 'добавить',
+    'нет совпадений': 'ананас',
+}
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск рецептов ?search= через таблицу FTS5 с прежним фильтром icontains '
+            'по названию и описанию: задержка первой страницы с подсчётом и число найденных рецептов '
+            'во временной базе заданного размера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                            help='Количество рецептов в базах')
+        parser.add_argument('--repeat', type=int, default=5, help='Количество замеров каждого запроса')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='benchmark_recipe_search.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        if sizes[0] < 1 or options['repeat'] < 1:
+            raise CommandError('--sizes и --repeat должны быть положительными')
+        if connection.vendor != 'sqlite':
+            raise CommandError('Сравнение с FTS5 поддерживается только для SQLite')
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(Path(directory) / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False):
+                    author = User.objects.create_user(email='search@example.com', username='search',
+                                                      password='password')
+                    results = [self._measure(author, size, options) for size in sizes]
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {'page_size': PAGE_SIZE, 'repeat': options['repeat'], 'results': results}
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        for result in results:
+            self.stdout.write(f'{result["recipes"]:>8} рецептов: заполнение с индексированием '
+                              f'{result["fill_seconds"]:.2f} с')
+            for name, query in result['queries'].items():
+                self.stdout.write(f'    {name:15} icontains {query["icontains_ms"]:9.2f} мс '
+                                  f'({query["icontains_rows"]:>7})   FTS5 {query["fts_ms"]:9.2f} мс '
+                                  f'({query["fts_rows"]:>7})')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    def _measure(self, author, size, options):
+        started = time.perf_counter()
+        self._fill(author, size - Recipe.objects.count(), options['seed'] + size)
+        fill_seconds = time.perf_counter() - started
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        queries = {}
+        for name, query in QUERIES.items():
+            icontains = self._time(SearchBackend().search(Recipe.objects.order_by('-pub_date', '-id'), query),
+                                   options['repeat'])
+            fts = self._time(SQLiteSearchBackend().search(Recipe.objects.all(), query), options['repeat'])
+            queries[name] = {
+                'query': query,
+                'icontains_ms': icontains[0],
+                'icontains_rows': icontains[1],
+                'fts_ms': fts[0],
+                'fts_rows': fts[1],
+            }
+        return {'recipes': size, 'fill_seconds': round(fill_seconds, 3), 'queries': queries}
+
+    @staticmethod
+    def _fill(author, count, seed):
+        rng = random.Random(seed)
+        for start in range(0, count, 5000):
+            recipes = Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'{rng.choice(DISHES)} {rng.choice(ADJECTIVES)} {number}',
+                       text=' '.join(rng.choices(TEXT_WORDS, k=12)), image='recipes/benchmark.png', cooking_time=10)
+                for number in range(start, min(start + 5000, count))
+            )
+            SQLiteSearchBackend().index_many(recipes)
+
+    @staticmethod
+    def _time(queryset, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = queryset.count()
+            list(queryset.values_list('pk', flat=True)[:PAGE_SIZE])
+            samples.append(time.perf_counter() - started)
+        return round(percentile(samples, 50) * 1000, 2), rows
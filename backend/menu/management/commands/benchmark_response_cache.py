@@ -0,0 +1,83 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from menu.management.commands.benchmark_endpoints import BENCHMARK_CACHES, DATASET_OPTIONS, throughput
+from menu.models import Recipe
+from menu.response_cache import recipe_response_cache
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность анонимных запросов списка и карточек рецептов '
+            'на сгенерированных данных без кэша ответов и с ним и сообщает долю попаданий в кэш.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=2000, help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=500, help='Количество ингредиентов')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6,
+                            help='Количество ингредиентов в рецепте')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных рецептов у пользователя')
+        parser.add_argument('--shopping-cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--pages', type=int, default=20,
+                            help='Количество разных страниц списка и карточек в обходе')
+        parser.add_argument('--requests', type=int, default=2000, help='Количество запросов в каждом замере')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора данных')
+        parser.add_argument('--output', default='benchmark_response_cache.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'recipes', 'ingredients', 'ingredients_per_recipe', 'pages', 'requests'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} должен быть положительным')
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                    DEBUG=False, MEDIA_ROOT=media_root, CACHES=BENCHMARK_CACHES, ALLOWED_HOSTS=['*']):
+                call_command('generate_fake_data', stdout=io.StringIO(),
+                             **{name: options[name] for name in DATASET_OPTIONS})
+                results = self._run(options['pages'], options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'dataset': {name: options[name] for name in DATASET_OPTIONS},
+            'pages': options['pages'],
+            'requests': options['requests'],
+            'results': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        for name, result in results.items():
+            self.stdout.write(f'{name:12} {result["requests_per_second"]:>6} запросов/с  '
+                              f'SQL на запрос {result["queries_per_request"]:6.2f}  '
+                              f'попадания {result["hit_ratio"]:.0%}')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    @staticmethod
+    def _run(pages, requests):
+        recipe_ids = Recipe.objects.order_by('-pub_date').values_list('pk', flat=True)[:pages]
+        paths = [path for page, pk in enumerate(recipe_ids, start=1)
+                 for path in (f'/api/recipes/?page={page}&limit=6', f'/api/recipes/{pk}/')]
+        results = {}
+        for name, shared in (('без кэша', False), ('кэш ответов', True)):
+            with override_settings(SHARED_CACHE=shared):
+                cache.clear()
+                stats = recipe_response_cache.stats
+                hits, misses = stats.hits, stats.misses
+                result = throughput(Client(), paths, requests)
+                lookups = stats.hits - hits + stats.misses - misses
+                result['hit_ratio'] = round((stats.hits - hits) / lookups, 3) if lookups else 0.0
+                results[name] = result
+        return results
@@ -0,0 +1,137 @@
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from menu.management.commands.benchmark_endpoints import BENCHMARK_CACHES, DATASET_OPTIONS, percentile
+from menu.models import Recipe
+from menu.renderers import ORJSONRenderer
+from menu.serializers import RecipeListSerializer, RecipeRowSerializer
+from menu.views import RecipeViewSet
+
+User = get_user_model()
+
+PHASES = ('fetch', 'serialize', 'render')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает RecipeListSerializer с JSONRenderer и RecipeRowSerializer с ORJSONRenderer '
+            'на страницах списка рецептов: замеряет микросекунды на рецепт для выборки, '
+            'сериализации и рендеринга.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=2000, help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=500, help='Количество ингредиентов')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6,
+                            help='Количество ингредиентов в рецепте')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных рецептов у пользователя')
+        parser.add_argument('--shopping-cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[10, 100],
+                            help='Размеры замеряемых страниц')
+        parser.add_argument('--repeat', type=int, default=50, help='Количество замеров каждой страницы')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора данных')
+        parser.add_argument('--output', default='benchmark_serializers.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'recipes', 'ingredients', 'ingredients_per_recipe', 'repeat'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} должен быть положительным')
+        if any(size < 1 for size in options['page_sizes']):
+            raise CommandError('--page-sizes должны быть положительными')
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                    MEDIA_ROOT=media_root, CACHES=BENCHMARK_CACHES, SHARED_CACHE=True, ALLOWED_HOSTS=['*']):
+                call_command('generate_fake_data', stdout=io.StringIO(),
+                             **{name: options[name] for name in DATASET_OPTIONS})
+                results = self._run(options['page_sizes'], options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'dataset': {name: options[name] for name in DATASET_OPTIONS},
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n',
+                                           encoding='utf-8')
+        for name, result in results.items():
+            for path in ('drf', 'rows'):
+                phases = '  '.join(f'{phase} {result[path][phase]:7.1f}' for phase in PHASES)
+                self.stdout.write(f'{name:12} {path:5} мкс/рецепт: {phases}  всего {result[path]["total"]:7.1f}')
+            self.stdout.write(f'{name:12} ускорение {result["speedup"]:.1f}x, JSON {result["bytes"]} Б')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    def _run(self, page_sizes, repeat):
+        reader = User.objects.annotate(favorites_total=Count('favorites')).order_by('-favorites_total', 'id').first()
+        results = {}
+        for audience, user in (('anon', AnonymousUser()), ('auth', reader)):
+            for page_size in page_sizes:
+                results[f'{audience}-{page_size}'] = self._measure(user, page_size, repeat)
+        return results
+
+    def _measure(self, user, page_size, repeat):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        content = self._rows(request, page_size)[-1]
+        count = len(json.loads(content))
+        samples = {'drf': [], 'rows': []}
+        for _ in range(repeat):
+            samples['drf'].append(self._drf(request, page_size)[:-1])
+            samples['rows'].append(self._rows(request, page_size)[:-1])
+        result = {'recipes': count, 'bytes': len(content)}
+        for path, timings in samples.items():
+            result[path] = {
+                phase: round(percentile([timing[index] for timing in timings], 50) / count * 10 ** 6, 2)
+                for index, phase in enumerate(PHASES)
+            }
+            result[path]['total'] = round(percentile([sum(timing) for timing in timings], 50) / count * 10 ** 6, 2)
+        result['speedup'] = round(result['drf']['total'] / result['rows']['total'], 2)
+        return result
+
+    @staticmethod
+    def _view(request, action):
+        return RecipeViewSet(request=request, action=action, format_kwarg=None, kwargs={})
+
+    def _drf(self, request, page_size):
+        view = self._view(request, 'retrieve')
+        started = time.perf_counter()
+        page = list(view.get_queryset()[:page_size])
+        context = view.get_serializer_context()
+        fetched = time.perf_counter()
+        data = RecipeListSerializer(page, many=True, context=context).data
+        serialized = time.perf_counter()
+        content = JSONRenderer().render(data)
+        rendered = time.perf_counter()
+        return fetched - started, serialized - fetched, rendered - serialized, content
+
+    def _rows(self, request, page_size):
+        view = self._view(request, 'list')
+        started = time.perf_counter()
+        rows = list(Recipe.objects.values_list(*RecipeRowSerializer.fields, named=True)[:page_size])
+        serializer = RecipeRowSerializer(rows, many=True, context=view.get_serializer_context())
+        ingredients, authors = list(serializer.get_ingredients(rows)), list(serializer.get_authors(rows))
+        fetched = time.perf_counter()
+        data = serializer.build(rows, ingredients, authors)
+        serialized = time.perf_counter()
+        content = ORJSONRenderer().render(data)
+        rendered = time.perf_counter()
+        return fetched - started, serialized - fetched, rendered - serialized, content
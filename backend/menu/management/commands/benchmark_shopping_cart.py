@@ -0,0 +1,115 @@
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from menu.models import Ingredient, Recipe, RecipeIngredient, ShoppingCartRelation
+from menu.shopping_list import RENDERERS
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Скачивает список покупок для корзин разного размера во временной базе и замеряет '
+            'время и пиковую память Python для каждого формата и для прежней сборки строки в памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+', default=[1000, 5000],
+                            help='Количество рецептов в корзине')
+        parser.add_argument('--ingredients', type=int, default=2000, help='Количество ингредиентов в каталоге')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10,
+                            help='Количество ингредиентов в рецепте')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='benchmark_shopping_cart.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['recipes'])
+        if sizes[0] < 1 or options['ingredients'] < options['ingredients_per_recipe'] or \
+                options['ingredients_per_recipe'] < 1:
+            raise CommandError('Размеры должны быть положительными, а --ingredients не меньше '
+                               '--ingredients-per-recipe')
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(Path(directory) / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False, ALLOWED_HOSTS=['*']):
+                    ingredients = Ingredient.objects.bulk_create(
+                        Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+                        for number in range(options['ingredients'])
+                    )
+                    results = [self._measure(size, ingredients, options) for size in sizes]
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        Path(options['output']).write_text(json.dumps({'results': results}, ensure_ascii=False, indent=2) + '\n',
+                                           encoding='utf-8')
+        for result in results:
+            for name, measurement in result['formats'].items():
+                self.stdout.write(f'{result["recipes"]:>6} рецептов  {name:7} {measurement["ms"]:9.1f} мс  '
+                                  f'пик {measurement["peak_kib"]:9.1f} КиБ  {measurement["bytes"]:>9} Б')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    def _measure(self, size, ingredients, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create_user(email=f'cart{size}@example.com', username=f'cart{size}', password='password')
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=user, name=f'рецепт {number}', text='описание', image='recipes/benchmark.png',
+                   cooking_time=10)
+            for number in range(size)
+        )
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=rng.randint(1, 500))
+             for recipe in recipes
+             for ingredient in rng.sample(ingredients, options['ingredients_per_recipe'])),
+            batch_size=5000,
+        )
+        ShoppingCartRelation.objects.bulk_create(
+            (ShoppingCartRelation(user=user, recipe=recipe) for recipe in recipes), batch_size=5000)
+
+        client = APIClient()
+        client.force_authenticate(user)
+        formats = {}
+        for file_format in RENDERERS:
+            formats[file_format] = self._trace(lambda: sum(
+                len(chunk) for chunk in client.get('/api/recipes/download_shopping_cart/',
+                                                   {'file_format': file_format}).streaming_content))
+        formats['legacy'] = self._trace(lambda: len(self._legacy(user).encode()))
+        return {'recipes': size, 'formats': formats}
+
+    @staticmethod
+    def _legacy(user):
+        """Прежняя реализация: все строки корзины в память, словарь в Python и одна строка ответа."""
+        rows = user.shopping_cart.all().values_list(
+            'recipe__recipe_ingredients__ingredient__name',
+            'recipe__recipe_ingredients__ingredient__measurement_unit',
+            'recipe__recipe_ingredients__amount'
+        )
+        shopping_list = {}
+        for name, unit, amount in rows:
+            if name not in shopping_list:
+                shopping_list[name] = {'amount': 0, 'unit': unit}
+            shopping_list[name]['amount'] += amount
+        text_content = 'Список покупок:\n\n'
+        for name, data in shopping_list.items():
+            text_content += f'{name} - {data["amount"]} {data["unit"]}\n'
+        return text_content
+
+    @staticmethod
+    def _trace(function):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = function()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {'ms': round(elapsed * 1000, 1), 'peak_kib': round(peak / 1024, 1), 'bytes': size}
@@ -0,0 +1,67 @@
+import json
+import random
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from menu.management.commands.benchmark_endpoints import BENCHMARK_CACHES, throughput
+from menu.models import Recipe, ShortLink
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность редиректов /s/<id> во временной базе: '
+            'с общим кэшем коротких ссылок и без него.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--links', type=int, default=1000, help='Количество коротких ссылок')
+        parser.add_argument('--requests', type=int, default=20000, help='Количество редиректов в каждом замере')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='benchmark_short_links.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        if options['links'] < 1 or options['requests'] < 1:
+            raise CommandError('--links и --requests должны быть положительными')
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(Path(directory) / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False, CACHES=BENCHMARK_CACHES, ALLOWED_HOSTS=['*']):
+                    paths = self._seed(options)
+                    results = {}
+                    for name, shared in (('без кэша', False), ('общий кэш', True)):
+                        with override_settings(SHARED_CACHE=shared):
+                            cache.clear()
+                            throughput(Client(), paths, len(paths))
+                            results[name] = throughput(Client(), paths, options['requests'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {'links': options['links'], 'requests': options['requests'], 'results': results}
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        for name, result in results.items():
+            self.stdout.write(f'{name:10} {result["requests_per_second"]:>7} запросов/с  '
+                              f'SQL на запрос {result["queries_per_request"]}')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    @staticmethod
+    def _seed(options):
+        author = User.objects.create_user(email='links@example.com', username='links', password='password')
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'рецепт {number}', text='описание', image='recipes/benchmark.png',
+                   cooking_time=10)
+            for number in range(options['links'])
+        )
+        links = ShortLink.objects.bulk_create(ShortLink(recipe=recipe) for recipe in recipes)
+        paths = [f'/s/{link.pk}' for link in links]
+        random.Random(options['seed']).shuffle(paths)
+        return paths
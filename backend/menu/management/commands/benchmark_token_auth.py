@@ -0,0 +1,95 @@
+import json
+import tempfile
+import time
+from itertools import cycle
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from menu.management.commands.benchmark_endpoints import BENCHMARK_CACHES, throughput
+from my_user.authentication import token_cache
+
+User = get_user_model()
+
+PATH = '/api/users/me/'
+
+
+class RotatingTokenClient(Client):
+    """Тестовый клиент, отправляющий каждый запрос со следующим токеном из keys."""
+
+    def __init__(self, keys):
+        super().__init__()
+        self.keys = cycle(keys)
+
+    def get(self, path, *args, **extra):
+        return super().get(path, *args, HTTP_AUTHORIZATION=f'Token {next(self.keys)}', **extra)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность аутентификации по токену без кэша токенов (запрос к базе) '
+            f'и с ним: отдельные поиски token_cache.get и запросы к {PATH} во временной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей с токенами')
+        parser.add_argument('--requests', type=int, default=5000, help='Количество запросов в каждом замере')
+        parser.add_argument('--output', default='benchmark_token_auth.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['requests']) < 1:
+            raise CommandError('--users и --requests должны быть положительными')
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST'] = {**connection.settings_dict['TEST'],
+                                                'NAME': str(Path(directory) / 'benchmark.sqlite3')}
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                with override_settings(DEBUG=False, CACHES=BENCHMARK_CACHES, ALLOWED_HOSTS=['*']):
+                    keys = self._seed(options['users'])
+                    results = self._run(keys, options['requests'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {'users': options['users'], 'requests': options['requests'], 'path': PATH, 'results': results}
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+        for name, result in results.items():
+            self.stdout.write(f'{name:12} поиск токена {result["lookups_per_second"]:>7} в с   '
+                              f'{PATH} {result["requests_per_second"]:>5} запросов/с  '
+                              f'SQL на запрос {result["queries_per_request"]:5.2f}  '
+                              f'попадания {result["hit_ratio"]:.0%}')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    @staticmethod
+    def _seed(count):
+        password = make_password('password')
+        users = User.objects.bulk_create(
+            User(email=f'token{number}@example.com', username=f'token{number}', password=password)
+            for number in range(count)
+        )
+        tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+        return [token.key for token in tokens]
+
+    @staticmethod
+    def _run(keys, requests):
+        results = {}
+        for name, shared in (('без кэша', False), ('кэш токенов', True)):
+            with override_settings(SHARED_CACHE=shared):
+                cache.clear()
+                stats = token_cache.stats
+                hits, misses = stats.hits, stats.misses
+                started = time.perf_counter()
+                for number in range(requests):
+                    token_cache.get(keys[number % len(keys)])
+                lookups_per_second = round(requests / (time.perf_counter() - started))
+                result = throughput(RotatingTokenClient(keys), [PATH], requests)
+                lookups = stats.hits - hits + stats.misses - misses
+                result['lookups_per_second'] = lookups_per_second
+                result['hit_ratio'] = round((stats.hits - hits) / lookups, 3) if lookups else 0.0
+                results[name] = result
+        return results
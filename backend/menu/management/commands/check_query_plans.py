@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from menu.models import Ingredient, Recipe, ShortLink
+from menu.query_plans import collect_plans, full_scans, hot_urls
+from menu.recipe_ingredient_index import recipe_ingredient_index
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Выполняет GET-запросы ко всем представлениям API, снимает EXPLAIN QUERY PLAN '
+            'для каждого SQL-запроса и завершается с ошибкой при полном сканировании больших таблиц. '
+            'Те же проверки на тестовых данных выполняет QueryPlanTests.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать планы всех запросов, а не только нарушения')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Проверка планов поддерживается только для SQLite')
+        with transaction.atomic():
+            user, recipe, ingredient = self._prepare()
+            try:
+                plans = collect_plans(user, hot_urls(user, recipe, ingredient))
+            except RuntimeError as error:
+                raise CommandError(str(error))
+            transaction.set_rollback(True)
+
+        violations = []
+        for url, sql, plan in plans:
+            scans = full_scans(sql, plan)
+            if scans:
+                violations.append((url, sql, scans))
+            if options['verbose_plans']:
+                self.stdout.write(f'{url}\n  {sql}\n  ' + '\n  '.join(plan))
+        for url, sql, scans in violations:
+            self.stderr.write(f'{url}\n  {sql}\n  ' + '\n  '.join(scans))
+        if violations:
+            raise CommandError(f'Полное сканирование больших таблиц в {len(violations)} запросах')
+        self.stdout.write(self.style.SUCCESS(f'Проверено запросов: {len(plans)}, полных сканирований нет'))
+
+    def _prepare(self):
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей')
+        recipe = Recipe.objects.order_by('id').first()
+        if recipe is not None:
+            ShortLink.objects.get_or_create(recipe=recipe)
+        ingredient = Ingredient.objects.order_by('id').first()
+        recipe_ingredient_index.match([], 1)
+        return user, recipe, ingredient
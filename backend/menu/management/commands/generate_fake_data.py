@@ -0,0 +1,241 @@
+import io
+import random
+import time
+from base64 import b64encode
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from menu import versions
+from menu.images import store_base64_image
+from menu.ingredient_index import ingredient_index
+from menu.models import FavoriteRelation, Ingredient, Recipe, RecipeIngredient, ShoppingCartRelation
+from menu.recipe_ingredient_index import recipe_ingredient_index
+from menu.search import get_search_backend
+from my_user.models import SubscriptionRelation
+
+User = get_user_model()
+
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Алексей', 'Елена', 'Дмитрий', 'Наталья', 'Сергей')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов', 'Морозов', 'Волков')
+DISHES = ('борщ', 'суп', 'салат', 'пирог', 'каша', 'котлеты', 'плов', 'блины', 'омлет', 'рагу',
+          'запеканка', 'пицца', 'паста', 'голубцы', 'сырники', 'пельмени')
+ADJECTIVES = ('домашний', 'быстрый', 'острый', 'сладкий', 'овощной', 'куриный', 'летний', 'бабушкин',
+              'печёный', 'жареный', 'постный', 'праздничный')
+TEXT_WORDS = ('нарезать', 'смешать', 'добавить', 'варить', 'жарить', 'запекать', 'посолить', 'поперчить',
+              'минут', 'до', 'готовности', 'на', 'среднем', 'огне', 'подавать', 'горячим', 'с', 'зеленью')
+UNITS = ('г', 'мл', 'шт', 'ст. л.', 'ч. л.')
+AMOUNTS = range(1, 501)
+COOKING_TIMES = range(5, 181)
+PUB_DATE_STEP = timedelta(minutes=7)
+BASE_DATE = '2025-01-01T00:00:00+00:00'
+SQLITE_CACHE_KIB = 262144
+
+
+def zipf_cum_weights(size, alpha):
+    return list(accumulate(rank ** -alpha for rank in range(1, size + 1)))
+
+
+def placeholder_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (230, 190, 120)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+class Command(BaseCommand):
+    help = ('Создаёт большой детерминированный набор пользователей, рецептов, избранного, корзин и подписок '
+            'со степенным распределением популярности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=50000, help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=0,
+                            help='Количество новых ингредиентов; по умолчанию используются имеющиеся')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8,
+                            help='Количество ингредиентов в рецепте')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных рецептов у пользователя')
+        parser.add_argument('--shopping-cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине пользователя')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Показатель степенного распределения популярности')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора')
+        parser.add_argument('--base-date', default=BASE_DATE,
+                            help='Дата самого нового рецепта и всех автоматических дат в формате ISO 8601')
+        parser.add_argument('--password', default='password', help='Пароль всех созданных пользователей')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Количество строк в одном INSERT')
+        parser.add_argument('--chunk-size', type=int, default=100000,
+                            help='Количество строк в одной транзакции')
+
+    def handle(self, *args, **options):
+        for name in ('users', 'recipes', 'ingredients_per_recipe', 'batch_size', 'chunk_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} должен быть положительным')
+        if options['alpha'] <= 0:
+            raise CommandError('--alpha должен быть положительным')
+        self.rng = random.Random(options['seed'])
+        self.alpha = options['alpha']
+        self.batch_size = options['batch_size']
+        self.chunk_size = options['chunk_size']
+        self.rows = 0
+        prefix = f'fake{options["seed"]}-'
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Данные с --seed {options["seed"]} уже созданы')
+
+        try:
+            self.base_date = datetime.fromisoformat(options['base_date'])
+        except ValueError:
+            raise CommandError('--base-date должен быть датой в формате ISO 8601')
+        if timezone.is_naive(self.base_date):
+            self.base_date = timezone.make_aware(self.base_date)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_KIB}')
+        started = time.perf_counter()
+        ingredient_ids = self._ingredients(options['ingredients'], prefix)
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError('Ингредиентов меньше, чем --ingredients-per-recipe; загрузите их командой '
+                               'load_ingredients или задайте --ingredients')
+        user_ids = self._users(options['users'], prefix, make_password(options['password']))
+        recipe_ids = self._recipes(options['recipes'], user_ids, store_base64_image(placeholder_image()))
+        self._recipe_ingredients(recipe_ids, ingredient_ids, options['ingredients_per_recipe'])
+        for model, mean in ((FavoriteRelation, options['favorites']),
+                            (ShoppingCartRelation, options['shopping_cart'])):
+            self._relations(model, 'user_id', 'recipe_id', user_ids, recipe_ids, mean)
+        self._relations(SubscriptionRelation, 'sender_id', 'to_id', user_ids, user_ids, options['subscriptions'],
+                        exclude_self=True)
+        inserted = time.perf_counter() - started
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [User, Recipe]):
+                cursor.execute(sql)
+
+        call_command('recount', stdout=io.StringIO())
+        ingredient_index.invalidate()
+        recipe_ingredient_index.invalidate()
+        versions.bump_version(versions.RECIPES)
+        versions.bump_version(versions.INGREDIENTS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк: {self.rows} за {inserted:.1f} с ({self.rows / inserted:.0f} строк/с), '
+            f'всего с пересчётом счётчиков {time.perf_counter() - started:.1f} с'
+        ))
+
+    def _insert(self, model, fields, rows, on_chunk=None):
+        """Вставляет кортежи значений полей fields пакетами по batch_size, по chunk_size строк в транзакции.
+
+        Строки идут в executemany напрямую, минуя создание объектов модели; остальные поля
+        получают значения по умолчанию. Значения полей fields должны быть уже приведены к виду БД.
+        """
+        constants = {}
+        for field in model._meta.concrete_fields:
+            if field.attname in fields or field.primary_key:
+                continue
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = self.base_date
+            elif field.has_default():
+                value = field.get_default()
+            elif field.null:
+                value = None
+            else:
+                raise CommandError(f'Не задано значение поля {model.__name__}.{field.name}')
+            constants[field.column] = field.get_db_prep_save(value, connection)
+        columns = [model._meta.get_field(name).column for name in fields] + list(constants)
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(map(connection.ops.quote_name, columns)),
+            ', '.join(['%s'] * len(columns)),
+        )
+        tail = tuple(constants.values())
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            with transaction.atomic(), connection.cursor() as cursor:
+                for start in range(0, len(chunk), self.batch_size):
+                    batch = chunk[start:start + self.batch_size]
+                    cursor.executemany(sql, [row + tail for row in batch] if tail else batch)
+                if on_chunk:
+                    on_chunk(chunk)
+            self.rows += len(chunk)
+
+    def _next_ids(self, model, count):
+        first = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        return range(first, first + count)
+
+    def _popular(self, population):
+        """Случайный порядок популярности и накопленные веса Ципфа для него."""
+        ranked = list(population)
+        self.rng.shuffle(ranked)
+        return ranked, zipf_cum_weights(len(ranked), self.alpha)
+
+    def _activity(self, mean):
+        """Число действий пользователя: распределение Парето со средним mean."""
+        return round(mean / 2 * self.rng.paretovariate(2)) if mean > 0 else 0
+
+    def _ingredients(self, count, prefix):
+        self._insert(Ingredient, ('name', 'measurement_unit'), (
+            (f'{prefix}ингредиент {i}', self.rng.choice(UNITS)) for i in range(count)
+        ))
+        return list(Ingredient.objects.order_by('id').values_list('id', flat=True))
+
+    def _users(self, count, prefix, password):
+        user_ids = self._next_ids(User, count)
+        rng = self.rng
+        self._insert(User, ('id', 'username', 'email', 'password', 'first_name', 'last_name'), (
+            (pk, f'{prefix}{i}', f'{prefix}{i}@example.com', password,
+             rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+            for i, pk in enumerate(user_ids)
+        ))
+        return user_ids
+
+    def _recipes(self, count, user_ids, image):
+        recipe_ids = self._next_ids(Recipe, count)
+        authors, cum_weights = self._popular(user_ids)
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        oldest = self.base_date - PUB_DATE_STEP * (count - 1)
+        rng = self.rng
+        self._insert(Recipe, ('id', 'author_id', 'name', 'text', 'cooking_time', 'image', 'pub_date'), (
+            (pk, author_id, f'{rng.choice(DISHES).capitalize()} {rng.choice(ADJECTIVES)}',
+             ' '.join(rng.choices(TEXT_WORDS, k=12)), cooking_time, image,
+             adapt_datetime(oldest + PUB_DATE_STEP * i))
+            for i, (pk, author_id, cooking_time) in enumerate(zip(
+                recipe_ids, rng.choices(authors, cum_weights=cum_weights, k=count),
+                rng.choices(COOKING_TIMES, k=count)))
+        ), on_chunk=lambda chunk: get_search_backend().index_rows(row[:1] + row[2:4] for row in chunk))
+        return recipe_ids
+
+    def _recipe_ingredients(self, recipe_ids, ingredient_ids, per_recipe):
+        ingredients, cum_weights = self._popular(ingredient_ids)
+        rng = self.rng
+
+        def rows():
+            for recipe_id in recipe_ids:
+                chosen = dict.fromkeys(rng.choices(ingredients, cum_weights=cum_weights, k=per_recipe * 2))
+                for ingredient_id, amount in zip(islice(chosen, per_recipe), rng.choices(AMOUNTS, k=per_recipe)):
+                    yield recipe_id, ingredient_id, amount
+
+        self._insert(RecipeIngredient, ('recipe_id', 'ingredient_id', 'amount'), rows())
+
+    def _relations(self, model, owner_field, target_field, owner_ids, target_ids, mean, exclude_self=False):
+        targets, cum_weights = self._popular(target_ids)
+        limit = len(targets) // 2
+        rng = self.rng
+
+        def rows():
+            for owner_id in owner_ids:
+                count = min(self._activity(mean), limit)
+                if not count:
+                    continue
+                for target_id in dict.fromkeys(rng.choices(targets, cum_weights=cum_weights, k=count)):
+                    if not exclude_self or target_id != owner_id:
+                        yield owner_id, target_id
+
+        self._insert(model, (owner_field, target_field), rows())
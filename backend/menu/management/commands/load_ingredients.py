@@ -0,0 +1,108 @@
+import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from menu import versions
+from menu.ingredient_index import ingredient_index
+from menu.models import Ingredient
+
+FORMATS = ('csv', 'jsonl', 'json')
+NAME_MAX_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_MAX_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV (name,measurement_unit) или JSONL. '
+            'Повторная загрузка не создаёт дубликатов; строки с некорректным JSON пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу с ингредиентами')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк в одном INSERT')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {path.suffix}')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        count_before = Ingredient.objects.count()
+        started = time.perf_counter()
+        processed = skipped = 0
+        with path.open(encoding='utf-8', newline='') as source:
+            rows = self._read_rows(source, file_format)
+            try:
+                while batch := list(islice(rows, batch_size)):
+                    ingredients = []
+                    for row in batch:
+                        ingredient = self._build_ingredient(row)
+                        if ingredient is None:
+                            skipped += 1
+                        else:
+                            ingredients.append(ingredient)
+                    with transaction.atomic():
+                        Ingredient.objects.bulk_create(ingredients, ignore_conflicts=True)
+                    processed += len(batch)
+            except UnicodeDecodeError as error:
+                raise CommandError(f'Файл {path} не в кодировке UTF-8: {error}')
+        elapsed = time.perf_counter() - started
+        created = Ingredient.objects.count() - count_before
+        ingredient_index.invalidate()
+        versions.bump_version(versions.INGREDIENTS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {processed}, добавлено: {created}, '
+            f'пропущено: {skipped}, {processed / elapsed if elapsed else 0:.0f} строк/с'
+        ))
+
+    def _read_rows(self, source, file_format):
+        """Строки файла; строка JSONL с некорректным JSON даёт None и предупреждение с её номером."""
+        if file_format == 'csv':
+            reader = csv.reader(source)
+            try:
+                yield from reader
+            except csv.Error as error:
+                raise CommandError(f'Строка {reader.line_num}: некорректный CSV ({error})')
+        elif file_format == 'jsonl':
+            for number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as error:
+                    self.stderr.write(f'Строка {number}: некорректный JSON ({error.msg}), строка пропущена')
+                    yield None
+        else:
+            try:
+                rows = json.load(source)
+            except json.JSONDecodeError as error:
+                raise CommandError(f'Строка {error.lineno}: некорректный JSON ({error.msg})')
+            if not isinstance(rows, list):
+                raise CommandError('Файл JSON должен содержать список ингредиентов')
+            yield from rows
+
+    def _build_ingredient(self, row):
+        if isinstance(row, dict):
+            name, unit = row.get('name'), row.get('measurement_unit')
+        elif isinstance(row, list) and len(row) == 2:
+            name, unit = row
+        else:
+            return None
+        if not isinstance(name, str) or not isinstance(unit, str):
+            return None
+        name, unit = name.strip(), unit.strip()
+        if not 0 < len(name) <= NAME_MAX_LENGTH or not 0 < len(unit) <= UNIT_MAX_LENGTH:
+            return None
+        return Ingredient(name=name, measurement_unit=unit)
@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from menu.counters import count_of
+from menu.models import FavoriteRelation, Recipe, ShoppingCartRelation
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного и корзин у рецептов '
+            'и количество рецептов у пользователей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Количество строк, пересчитываемых в одной транзакции')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        recipes_fixed = self._recount(Recipe, batch_size, {
+            'favorites_count': count_of(FavoriteRelation, 'recipe'),
+            'in_carts_count': count_of(ShoppingCartRelation, 'recipe'),
+        })
+        users_fixed = self._recount(User, batch_size, {
+            'recipes_count': count_of(Recipe, 'author'),
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {recipes_fixed}, пользователей: {users_fixed}'
+        ))
+
+    def _recount(self, model, batch_size, counters):
+        fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(model.objects.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return fixed
+            last_pk = pks[-1]
+            batch = model.objects.filter(pk__gte=pks[0], pk__lte=last_pk)
+            drifted = Q()
+            for field, expression in counters.items():
+                drifted |= ~Q(**{field: expression})
+            with transaction.atomic():
+                fixed += batch.filter(drifted).update(**counters)
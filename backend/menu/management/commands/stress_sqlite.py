@@ -0,0 +1,181 @@
+import io
+import json
+import logging
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from menu.management.commands.benchmark_endpoints import BENCHMARK_CACHES, percentile
+from menu.models import Recipe
+
+User = get_user_model()
+
+WRITE_KINDS = ('favorite', 'shopping_cart', 'subscribe')
+
+
+def apply_profile(path, profile):
+    """Переключает соединение процесса на файл path с настройками профиля SQLITE_PROFILES."""
+    connections.close_all()
+    connection.settings_dict.update(
+        NAME=path, CONN_MAX_AGE=profile['CONN_MAX_AGE'], OPTIONS=dict(profile['OPTIONS'])
+    )
+    settings.SQLITE_PRAGMAS = profile['PRAGMAS']
+
+
+def run_worker(path, profile, token, recipe_ids, author_ids, options, seed, deadline, results):
+    """Цикл запросов одного процесса до deadline; после каждого запроса соединение
+    закрывается так же, как в request_finished у WSGI-сервера, если его возраст вышел."""
+    apply_profile(path, profile)
+    settings.SQL_INSTRUMENTATION_SAMPLE_RATE = 0
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    rng = random.Random(seed)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+    added = {kind: [] for kind in WRITE_KINDS}
+    latencies = {'read': [], 'write': []}
+    errors = {'locked': 0, 'other': 0}
+    while time.monotonic() < deadline:
+        if rng.random() < options['write_ratio']:
+            kind = rng.choice(WRITE_KINDS)
+            if added[kind] and (len(added[kind]) >= 20 or rng.random() < 0.5):
+                target, method = added[kind].pop(rng.randrange(len(added[kind]))), 'delete'
+            else:
+                target, method = rng.choice(author_ids if kind == 'subscribe' else recipe_ids), 'post'
+            prefix = 'users' if kind == 'subscribe' else 'recipes'
+            url = f'/api/{prefix}/{target}/{kind}/'
+            operation = 'write'
+        else:
+            url = rng.choice(('/api/recipes/?limit=10', f'/api/recipes/{rng.choice(recipe_ids)}/'))
+            method, operation = 'get', 'read'
+        started = time.perf_counter()
+        try:
+            response = getattr(client, method)(url)
+        except OperationalError as error:
+            errors['locked' if 'locked' in str(error) else 'other'] += 1
+            connections.close_all()
+            continue
+        finally:
+            close_old_connections()
+        latencies[operation].append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            errors['other'] += 1
+        elif operation == 'write' and method == 'post' and response.status_code == 201:
+            added[kind].append(target)
+    connections.close_all()
+    results.put((latencies, errors))
+
+
+class Command(BaseCommand):
+    help = ('Нагружает копию сгенерированной SQLite-базы несколькими процессами чтения и записи '
+            'для каждого профиля SQLITE_PROFILES и сравнивает пропускную способность и число блокировок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Количество процессов-клиентов')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность нагрузки на профиль, с')
+        parser.add_argument('--write-ratio', type=float, default=0.3, help='Доля запросов на запись')
+        parser.add_argument('--users', type=int, default=200, help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=5000, help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=500, help='Количество ингредиентов')
+        parser.add_argument('--profiles', nargs='+', default=list(settings.SQLITE_PROFILES),
+                            help='Сравниваемые профили из SQLITE_PROFILES')
+        parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора')
+        parser.add_argument('--output', default='stress_sqlite.json', help='Путь к JSON-отчёту')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда предназначена только для SQLite')
+        unknown = set(options['profiles']) - set(settings.SQLITE_PROFILES)
+        if unknown:
+            raise CommandError(f'Неизвестные профили: {", ".join(sorted(unknown))}')
+        if options['processes'] < 1 or options['duration'] <= 0 or not 0 <= options['write_ratio'] <= 1:
+            raise CommandError('--processes и --duration должны быть положительными, --write-ratio — от 0 до 1')
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                MEDIA_ROOT=directory, CACHES=BENCHMARK_CACHES, ALLOWED_HOSTS=['*']):
+            source = str(Path(directory) / 'source.sqlite3')
+            workload = self._prepare(source, options)
+            results = {}
+            for name in options['profiles']:
+                path = str(Path(directory) / f'{name}.sqlite3')
+                shutil.copyfile(source, path)
+                results[name] = self._run(path, settings.SQLITE_PROFILES[name], workload, options)
+
+        report = {
+            'dataset': {name: options[name] for name in ('users', 'recipes', 'ingredients', 'seed')},
+            'processes': options['processes'],
+            'duration_s': options['duration'],
+            'write_ratio': options['write_ratio'],
+            'profiles': results,
+        }
+        Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + '\n',
+                                           encoding='utf-8')
+        for name, result in results.items():
+            self.stdout.write(f'{name:12} {result["requests_per_second"]:8.1f} запр/с  '
+                              f'чтение p95 {result["read_p95_ms"]:8.2f} мс  '
+                              f'запись p95 {result["write_p95_ms"]:8.2f} мс  '
+                              f'блокировок {result["locked_errors"]}  прочих ошибок {result["other_errors"]}')
+        self.stdout.write(self.style.SUCCESS(f'Отчёт сохранён в {options["output"]}'))
+
+    def _prepare(self, path, options):
+        original = dict(connection.settings_dict)
+        apply_profile(path, settings.SQLITE_PROFILES['development'])
+        try:
+            call_command('migrate', verbosity=0)
+            call_command('generate_fake_data', stdout=io.StringIO(), users=options['users'],
+                         recipes=options['recipes'], ingredients=options['ingredients'], seed=options['seed'])
+            users = list(User.objects.order_by('id')[:options['processes']])
+            return {
+                'tokens': [Token.objects.get_or_create(user=user)[0].key for user in users],
+                'recipe_ids': list(Recipe.objects.values_list('id', flat=True)),
+                'author_ids': list(User.objects.values_list('id', flat=True)),
+            }
+        finally:
+            connections.close_all()
+            connection.settings_dict.update(original)
+
+    def _run(self, path, profile, workload, options):
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        deadline = time.monotonic() + options['duration']
+        processes = [
+            context.Process(target=run_worker, args=(
+                path, profile, workload['tokens'][number % len(workload['tokens'])], workload['recipe_ids'],
+                workload['author_ids'], options, options['seed'] + number, deadline, results
+            ))
+            for number in range(options['processes'])
+        ]
+        connections.close_all()
+        for process in processes:
+            process.start()
+        latencies = {'read': [], 'write': []}
+        errors = {'locked': 0, 'other': 0}
+        for _ in processes:
+            worker_latencies, worker_errors = results.get()
+            for operation, samples in worker_latencies.items():
+                latencies[operation].extend(samples)
+            for kind, count in worker_errors.items():
+                errors[kind] += count
+        for process in processes:
+            process.join()
+        requests = sum(map(len, latencies.values()))
+        return {
+            'requests': requests,
+            'requests_per_second': round(requests / options['duration'], 1),
+            'reads': len(latencies['read']),
+            'writes': len(latencies['write']),
+            'read_p95_ms': round(percentile(latencies['read'], 95) * 1000, 2) if latencies['read'] else 0.0,
+            'write_p95_ms': round(percentile(latencies['write'], 95) * 1000, 2) if latencies['write'] else 0.0,
+            'locked_errors': errors['locked'],
+            'other_errors': errors['other'],
+        }
@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную SQLite-базу в файл реплики DATABASE_REPLICA_ALIAS. '
+            'С --interval повторяет копирование, имитируя отставание реплики.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Период копирования в секундах; 0 — скопировать один раз')
+
+    def handle(self, *args, **options):
+        alias = settings.DATABASE_REPLICA_ALIAS
+        if alias not in settings.DATABASES:
+            raise CommandError(f'База {alias} не настроена: задайте REPLICA_DB_NAME')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite' or connections[alias].vendor != 'sqlite':
+            raise CommandError('Команда копирует только SQLite; для других СУБД используйте их репликацию')
+        if options['interval'] < 0:
+            raise CommandError('--interval не может быть отрицательным')
+
+        while True:
+            started = time.perf_counter()
+            primary.ensure_connection()
+            with sqlite3.connect(settings.DATABASES[alias]['NAME']) as replica:
+                primary.connection.backup(replica)
+            replica.close()
+            self.stdout.write(f'Реплика обновлена за {(time.perf_counter() - started) * 1000:.0f} мс')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,265 @@
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from menu.db_router import (ais_sticky, astick_to_primary, is_sticky, read_from_replica, stick_to_primary,
+                            wrote_to_primary)
+
+logger = logging.getLogger('menu.sql')
+
+current_stats = ContextVar('current_query_stats', default=None)
+
+APPLICATION_ROOT = str(settings.BASE_DIR)
+
+
+def application_frame():
+    """Ближайший к месту вызова кадр стека из кода проекта, а не из Django и библиотек."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APPLICATION_ROOT) and filename != __file__ and 'site-packages' not in filename:
+            return f'{filename[len(APPLICATION_ROOT) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def view_name(request):
+    match = request.resolver_match
+    if match is None:
+        return None
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return match.view_name or view.__qualname__
+    action = getattr(view, 'actions', {}).get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class QueryStats:
+    """Число SQL-запросов запроса, их суммарное время и повторы одинакового SQL."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.signatures = {}
+        self.duplicates = {}
+        self.slow_queries = []
+        self.duplicate_threshold = settings.SQL_DUPLICATE_QUERY_THRESHOLD
+        self.slow_query_seconds = settings.SQL_SLOW_QUERY_MS / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            repeats = self.signatures.get(sql, 0) + 1
+            self.signatures[sql] = repeats
+            if repeats == self.duplicate_threshold:
+                self.duplicates[sql] = application_frame()
+            if duration >= self.slow_query_seconds:
+                self.slow_queries.append((sql, duration, application_frame()))
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка execute_wrapper всех соединений: передаёт запрос в QueryStats текущего HTTP-запроса.
+
+    Статистика хранится в контекстной переменной, поэтому учитываются и запросы
+    асинхронного ORM, выполняемые в потоках sync_to_async.
+    """
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+class SQLInstrumentationMiddleware:
+    """Замеряет SQL-запросы выборки HTTP-запросов и пишет в журнал menu.sql медленные
+    запросы и повторы одинакового SQL (признак N+1).
+
+    Доля замеряемых запросов задаётся SQL_INSTRUMENTATION_SAMPLE_RATE; для них в ответ
+    добавляется заголовок Server-Timing со временем БД и всего запроса.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.SQL_INSTRUMENTATION_SAMPLE_RATE:
+            return await self.get_response(request)
+        stats = QueryStats()
+        token = current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self._finish(request, response, stats, time.perf_counter() - started)
+
+    def _finish(self, request, response, stats, duration):
+        response['Server-Timing'] = (
+            f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries, {len(stats.duplicates)} duplicated", '
+            f'total;dur={duration * 1000:.2f}'
+        )
+        if stats.slow_queries or stats.duplicates or duration * 1000 >= settings.SQL_SLOW_REQUEST_MS:
+            self._log(request, response, stats, duration)
+        return response
+
+    @staticmethod
+    def _log(request, response, stats, duration):
+        view = view_name(request)
+        for sql, query_duration, frame in stats.slow_queries:
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'view': view,
+                'path': request.path,
+                'duration_ms': round(query_duration * 1000, 2),
+                'sql': sql,
+                'frame': frame,
+            }, ensure_ascii=False))
+        slow = duration * 1000 >= settings.SQL_SLOW_REQUEST_MS
+        if slow or stats.duplicates:
+            logger.warning(json.dumps({
+                'event': 'slow_request' if slow else 'duplicate_queries',
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'db_ms': round(stats.duration * 1000, 2),
+                'queries': stats.count,
+                'duplicates': [
+                    {'sql': sql, 'count': stats.signatures[sql], 'frame': frame}
+                    for sql, frame in stats.duplicates.items()
+                ],
+            }, ensure_ascii=False))
+
+
+class ReplicaRoutingMiddleware:
+    """Разрешает чтения из реплики для безопасных HTTP-запросов.
+
+    После записи клиент на REPLICA_LAG_SECONDS секунд закрепляется за основной базой,
+    чтобы сразу видеть свои изменения, даже если реплика отстаёт. Закрепление передаётся
+    подписанной cookie REPLICA_PIN_COOKIE_NAME, а при общем кэше (SHARED_CACHE) ещё и
+    запоминается для учётных данных запроса (токена или cookie сессии) — для клиентов без cookie.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def credential(request):
+        return request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+    @staticmethod
+    def is_pinned(request):
+        return request.get_signed_cookie(settings.REPLICA_PIN_COOKIE_NAME, default=None,
+                                         max_age=settings.REPLICA_LAG_SECONDS) is not None
+
+    @staticmethod
+    def should_pin(request):
+        return (settings.DATABASE_REPLICA_ALIAS in settings.DATABASES
+                and (wrote_to_primary.get() or request.method not in SAFE_METHODS))
+
+    @staticmethod
+    def pin(response):
+        response.set_signed_cookie(settings.REPLICA_PIN_COOKIE_NAME, '1', max_age=settings.REPLICA_LAG_SECONDS,
+                                   httponly=True, samesite='Lax')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        credential = self.credential(request)
+        replica = (request.method in SAFE_METHODS and not self.is_pinned(request)
+                   and not (credential and is_sticky(credential)))
+        replica_token = read_from_replica.set(replica)
+        wrote_token = wrote_to_primary.set(False)
+        try:
+            response = self.get_response(request)
+            if self.should_pin(request):
+                self.pin(response)
+                if credential:
+                    stick_to_primary(credential)
+            return response
+        finally:
+            read_from_replica.reset(replica_token)
+            wrote_to_primary.reset(wrote_token)
+
+    async def __acall__(self, request):
+        credential = self.credential(request)
+        replica = (request.method in SAFE_METHODS and not self.is_pinned(request)
+                   and not (credential and await ais_sticky(credential)))
+        replica_token = read_from_replica.set(replica)
+        wrote_token = wrote_to_primary.set(False)
+        try:
+            response = await self.get_response(request)
+            if self.should_pin(request):
+                self.pin(response)
+                if credential:
+                    await astick_to_primary(credential)
+            return response
+        finally:
+            read_from_replica.reset(replica_token)
+            wrote_to_primary.reset(wrote_token)
+
+
+class ConcurrencyLimitMiddleware:
+    """Под ASGI пропускает к представлениям не больше ASGI_CONCURRENCY_LIMIT запросов одновременно.
+
+    Синхронные представления и запросы к БД выполняются в отдельном потоке на запрос, поэтому
+    ограничение держит число занятых потоков и соединений. Тело запроса Django читает до цепочки
+    middleware, а ответ отправляет после неё, поэтому медленные клиенты места не занимают.
+    Middleware должен стоять последним; под WSGI число потоков задаёт сервер, и он ничего не делает.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.semaphore = asyncio.Semaphore(settings.ASGI_CONCURRENCY_LIMIT)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        async with self.semaphore:
+            return await self.get_response(request)
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 10:30
+
+import django.db.models.deletion
+import menu.models
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_short_links(apps, schema_editor):
+    ShortLink = apps.get_model("menu", "ShortLink")
+    keep_ids = ShortLink.objects.values("recipe").annotate(keep_id=Min("id")).values("keep_id")
+    ShortLink.objects.exclude(id__in=keep_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("menu", "0004_ingredient_unique_ingredient"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_short_links, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="shortlink",
+            name="id",
+            field=models.CharField(
+                default=menu.models.generate_short_link_id,
+                max_length=8,
+                primary_key=True,
+                serialize=False,
+                verbose_name="Короткий идентификатор",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="shortlink",
+            name="recipe",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="short_link",
+                to="menu.recipe",
+                verbose_name="Рецепт",
+            ),
+        ),
+    ]
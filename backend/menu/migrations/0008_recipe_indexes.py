@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("menu", "0007_recipe_pub_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="recipeingredient",
+            options={
+                "ordering": ("recipe_id", "id"),
+                "verbose_name": "Ингредиент рецепта",
+                "verbose_name_plural": "Ингредиенты рецептов",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["author", "-pub_date", "-id"], name="recipe_author_pub_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["updated_at"], name="recipe_updated_at_idx"),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model("menu", "Recipe")
+    FavoriteRelation = apps.get_model("menu", "FavoriteRelation")
+    ShoppingCartRelation = apps.get_model("menu", "ShoppingCartRelation")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Recipe.objects.update(
+        favorites_count=count_of(FavoriteRelation, "recipe"),
+        in_carts_count=count_of(ShoppingCartRelation, "recipe"),
+    )
+    User.objects.update(recipes_count=count_of(Recipe, "author"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("menu", "0008_recipe_indexes"),
+        ("my_user", "0002_customuser_recipes_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В избранном"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="in_carts_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В корзинах"
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
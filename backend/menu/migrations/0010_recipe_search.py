@@ -0,0 +1,79 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:10
+
+import django.db.models.deletion
+import menu.models
+from django.db import migrations, models
+
+from menu.stemmer import stem_words
+
+BATCH_SIZE = 1000
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Recipe = apps.get_model("menu", "Recipe")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE menu_recipe_fts USING fts5("
+            "name, text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            "INSERT INTO menu_recipe_fts (menu_recipe_fts, rank) "
+            "VALUES ('rank', 'bm25(10.0, 1.0)')"
+        )
+        rows = []
+        for pk, name, text in Recipe.objects.values_list("id", "name", "text").iterator():
+            rows.append((pk, " ".join(stem_words(name)), " ".join(stem_words(text))))
+            if len(rows) == BATCH_SIZE:
+                cursor.executemany(
+                    "INSERT INTO menu_recipe_fts (rowid, name, text) VALUES (%s, %s, %s)", rows
+                )
+                rows = []
+        if rows:
+            cursor.executemany(
+                "INSERT INTO menu_recipe_fts (rowid, name, text) VALUES (%s, %s, %s)", rows
+            )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS menu_recipe_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("menu", "0009_recipe_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeSearchDocument",
+            fields=[
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="menu.recipe",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("text", models.TextField()),
+                (
+                    "document",
+                    menu.models.SearchDocumentField(db_column="menu_recipe_fts"),
+                ),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "menu_recipe_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
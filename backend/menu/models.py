@@ -3,6 +3,7 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from menu.counters import CounterFieldsMixin
 from myproject.settings import MIN_TIME, MAX_TIME
 
 
@@ -11,6 +12,12 @@ class Ingredient(models.Model):
     measurement_unit = models.CharField(max_length=64, verbose_name='Единица измерения')
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -21,7 +28,7 @@ class Ingredient(models.Model):
 User = get_user_model()
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -41,9 +48,19 @@ class Recipe(models.Model):
         verbose_name='Ингредиенты'
     )
     pub_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата публикации')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+    favorites_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах')
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+            models.Index(fields=['updated_at'], name='recipe_updated_at_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -68,7 +85,7 @@ class RecipeIngredient(models.Model):
                                                           MaxValueValidator(MAX_TIME)], verbose_name='Количество')
 
     class Meta:
-        ordering = ('recipe__name',)
+        ordering = ('recipe_id', 'id')
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецептов'
 
@@ -132,16 +149,21 @@ class ShoppingCartRelation(models.Model):
         return f'{str(self.user)} -> {str(self.recipe)} (корзина)'
 
 
+def generate_short_link_id():
+    return shortuuid.ShortUUID().random(length=8)
+
+
 class ShortLink(models.Model):
     id = models.CharField(
         max_length=8,
         primary_key=True,
-        default=shortuuid.uuid,
+        default=generate_short_link_id,
         verbose_name='Короткий идентификатор'
     )
-    recipe = models.ForeignKey(
+    recipe = models.OneToOneField(
         Recipe,
         on_delete=models.CASCADE,
+        related_name='short_link',
         verbose_name='Рецепт'
     )
 
@@ -151,3 +173,43 @@ class ShortLink(models.Model):
 
     def __str__(self):
         return f'Ссылка {self.id} на {str(self.recipe)}'
+
+    @staticmethod
+    def cache_key(pk):
+        return f'short-link:{pk}'
+
+
+class SearchDocumentField(models.TextField):
+    """Скрытый столбец FTS5-таблицы, одноимённый самой таблице; к нему применяется MATCH."""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class RecipeSearchDocument(models.Model):
+    """Строка полнотекстового индекса рецептов SQLite FTS5 (rowid = id рецепта).
+
+    Таблица создаётся миграцией и заполняется основами слов из menu.stemmer.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_document'
+    )
+    name = models.TextField()
+    text = models.TextField()
+    document = SearchDocumentField(db_column='menu_recipe_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'menu_recipe_fts'
@@ -0,0 +1,90 @@
+import re
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+TABLE_ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?([A-Z]\d+)\b')
+
+LARGE_TABLES = (
+    'menu_recipe',
+    'menu_recipeingredient',
+    'menu_favoriterelation',
+    'menu_shoppingcartrelation',
+    'menu_shortlink',
+    'my_user_customuser',
+    'my_user_subscriptionrelation',
+    'authtoken_token',
+)
+
+
+def hot_urls(user, recipe=None, ingredient=None):
+    """GET-маршруты API, планы запросов которых проверяются."""
+    urls = [
+        '/api/recipes/',
+        '/api/recipes/?limit=100&page=2',
+        f'/api/recipes/?author={user.pk}',
+        '/api/recipes/?is_favorited=1',
+        '/api/recipes/?is_in_shopping_cart=1',
+        '/api/recipes/?search=суп',
+        '/api/recipes/?cursor=',
+        f'/api/recipes/?cursor=&author={user.pk}',
+        '/api/recipes/download_shopping_cart/',
+        '/api/users/',
+        f'/api/users/{user.pk}/',
+        '/api/users/me/',
+        '/api/users/me/avatar/',
+        '/api/users/subscriptions/?recipes_limit=3',
+        '/api/ingredients/',
+    ]
+    if recipe is not None:
+        urls += [
+            f'/api/recipes/{recipe.pk}/',
+            f'/api/recipes/{recipe.pk}/get-link/',
+            f'/s/{recipe.short_link.pk}',
+        ]
+    if ingredient is not None:
+        urls += [
+            f'/api/ingredients/{ingredient.pk}/',
+            f'/api/ingredients/?name={ingredient.name[:2]}',
+            f'/api/recipes/from_ingredients/?ingredients={ingredient.pk}',
+        ]
+    return urls
+
+
+def collect_plans(user, urls):
+    """Выполняет GET-запросы к urls от имени user и возвращает (url, sql, план) каждого SELECT."""
+    statements = {}
+    current_url = None
+
+    def capture(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            statements.setdefault(sql, (params, current_url))
+        return execute(sql, params, many, context)
+
+    client = Client(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+    with override_settings(ALLOWED_HOSTS=['*']), connection.execute_wrapper(capture):
+        for current_url in urls:
+            response = client.get(current_url)
+            if response.status_code >= 500:
+                raise RuntimeError(f'{current_url} вернул {response.status_code}')
+    return [(url, sql, explain(sql, params)) for sql, (params, url) in statements.items()]
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql, plan):
+    """Строки плана, в которых большая таблица сканируется без индекса."""
+    aliases = dict((alias, table) for table, alias in TABLE_ALIAS_RE.findall(sql))
+    scans = []
+    for detail in plan:
+        words = detail.split()
+        if (len(words) >= 2 and words[0] == 'SCAN' and aliases.get(words[1], words[1]) in LARGE_TABLES
+                and 'USING' not in words):
+            scans.append(detail)
+    return scans
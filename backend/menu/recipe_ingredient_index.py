@@ -0,0 +1,214 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import groupby
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection
+
+from menu.models import RecipeIngredient
+
+DENSE_POSTING_RATIO = 64
+
+
+def rank(pair):
+    found, total = pair
+    return found / total, found - total
+
+
+def to_bits(posting):
+    if isinstance(posting, int):
+        return posting
+    if not posting:
+        return 0
+    bits = bytearray(posting[-1] // 8 + 1)
+    for pk in posting:
+        bits[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс «ингредиент -> id рецептов» в памяти процесса.
+
+    Редкие ингредиенты хранятся отсортированным массивом id, частые — битовой маской;
+    маски рецептов сгруппированы по числу ингредиентов. Изменения из других процессов
+    подхватываются через RECIPE_INGREDIENT_INDEX_TTL секунд: устаревший индекс
+    перестраивается в фоновом потоке, а запросы тем временем читают прежний.
+    Изменения, сделанные во время перестроения, записываются в журнал и повторяются
+    на новом снимке; invalidate() во время перестроения отбрасывает его результат.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0.0
+        self._refreshing = False
+        self._journal = None
+
+    def match(self, ingredient_ids, limit):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Возвращает до limit кортежей (id рецепта, найдено ингредиентов, всего ингредиентов)
+        по убыванию доли найденных, затем по возрастанию числа недостающих, затем новые раньше.
+        """
+        postings, by_total = self._get_snapshot()
+        planes = []
+        for pk in set(ingredient_ids):
+            carry = to_bits(postings.get(pk, 0))
+            for position, plane in enumerate(planes):
+                planes[position], carry = plane ^ carry, plane & carry
+            if carry:
+                planes.append(carry)
+        if not planes:
+            return []
+
+        found_any = 0
+        for plane in planes:
+            found_any |= plane
+        found_exactly = {}
+        pairs = sorted(
+            ((found, total) for total in by_total for found in range(1, min(total, 2 ** len(planes) - 1) + 1)),
+            key=rank, reverse=True
+        )
+        matches = []
+        for _, group in groupby(pairs, key=rank):
+            buckets = []
+            candidates = 0
+            for found, total in group:
+                if found not in found_exactly:
+                    mask = found_any
+                    for position, plane in enumerate(planes):
+                        mask &= plane if found >> position & 1 else ~plane
+                    found_exactly[found] = mask
+                bucket = found_exactly[found] & by_total[total]
+                if bucket:
+                    buckets.append((bucket, found, total))
+                    candidates |= bucket
+            while candidates and len(matches) < limit:
+                pk = candidates.bit_length() - 1
+                candidates ^= 1 << pk
+                matches.append(next((pk, found, total) for bucket, found, total in buckets if bucket >> pk & 1))
+            if len(matches) == limit:
+                break
+        return matches
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        self._update(self._with_recipe, recipe_id, frozenset(ingredient_ids))
+
+    def remove_recipe(self, recipe_id):
+        self._update(self._without, recipe_id)
+
+    def remove_ingredient(self, ingredient_id):
+        self._update(self._without_ingredient, ingredient_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._journal = None
+
+    def _update(self, change, *args):
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot = change(self._snapshot, *args)
+            if self._journal is not None:
+                self._journal.append((change, args))
+
+    @classmethod
+    def _with_recipe(cls, snapshot, recipe_id, ingredient_ids):
+        postings, by_total = cls._without(snapshot, recipe_id)
+        for pk in ingredient_ids:
+            posting = postings.get(pk, array('q'))
+            if isinstance(posting, int):
+                posting |= 1 << recipe_id
+            else:
+                posting = array('q', posting)
+                posting.insert(bisect_left(posting, recipe_id), recipe_id)
+            postings[pk] = posting
+        total = len(ingredient_ids)
+        if total:
+            by_total[total] = by_total.get(total, 0) | 1 << recipe_id
+        return postings, by_total
+
+    @staticmethod
+    def _without_ingredient(snapshot, ingredient_id):
+        postings, by_total = snapshot
+        postings = dict(postings)
+        postings.pop(ingredient_id, None)
+        return postings, by_total
+
+    @staticmethod
+    def _without(snapshot, recipe_id):
+        postings, by_total = snapshot
+        postings, by_total = dict(postings), dict(by_total)
+        bit = 1 << recipe_id
+        for pk, posting in postings.items():
+            if isinstance(posting, int):
+                if posting & bit:
+                    postings[pk] = posting ^ bit
+                continue
+            position = bisect_left(posting, recipe_id)
+            if position < len(posting) and posting[position] == recipe_id:
+                posting = array('q', posting)
+                del posting[position]
+                postings[pk] = posting
+        for total, recipes in by_total.items():
+            if recipes & bit:
+                by_total[total] = recipes ^ bit
+        return postings, by_total
+
+    def _get_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None:
+            if time.monotonic() - self._built_at >= settings.RECIPE_INGREDIENT_INDEX_TTL:
+                self._start_refresh()
+            return snapshot
+        with self._lock:
+            if self._snapshot is snapshot:
+                self._snapshot = self._build()
+                self._built_at = time.monotonic()
+            return self._snapshot
+
+    def _start_refresh(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._journal = []
+        threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        try:
+            snapshot = self._build()
+            with self._lock:
+                if self._journal is not None:
+                    for change, args in self._journal:
+                        snapshot = change(snapshot, *args)
+                    self._snapshot = snapshot
+                    self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._journal = None
+                self._refreshing = False
+            connection.close()
+
+    def _build(self):
+        postings = {}
+        totals = array('H')
+        for ingredient_id, recipe_id in RecipeIngredient.objects.using(DEFAULT_DB_ALIAS).order_by().values_list(
+                'ingredient_id', 'recipe_id').iterator(chunk_size=10000):
+            postings.setdefault(ingredient_id, array('q')).append(recipe_id)
+            if recipe_id >= len(totals):
+                totals.extend(array('H', [0]) * (recipe_id + 1 - len(totals)))
+            totals[recipe_id] += 1
+        for pk, posting in postings.items():
+            posting = array('q', sorted(posting))
+            postings[pk] = to_bits(posting) if len(posting) * DENSE_POSTING_RATIO > len(totals) else posting
+        by_total = {}
+        for recipe_id, total in enumerate(totals):
+            if total:
+                by_total.setdefault(total, array('q')).append(recipe_id)
+        return postings, {total: to_bits(recipes) for total, recipes in by_total.items()}
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from menu import versions
+from menu.cache_stats import CacheStats
+from menu.models import FavoriteRelation, ShoppingCartRelation
+
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+RELATION_MODELS = {
+    FAVORITES: FavoriteRelation,
+    SHOPPING_CART: ShoppingCartRelation,
+}
+
+
+class RecipeSetCache:
+    """Множества id рецептов из избранного и корзины пользователя в кэше Django.
+
+    Ключ содержит версию связей пользователя: любое изменение избранного или корзины
+    меняет версию, поэтому множество, прочитанное до изменения, больше не используется.
+    Без общего кэша (SHARED_CACHE) множества читаются из базы.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats('recipe_sets')
+
+    def get(self, user_id, kind):
+        if not settings.SHARED_CACHE:
+            return frozenset(self._queryset(user_id, kind))
+        key = self._key(user_id, kind)
+        recipe_ids = cache.get(key)
+        if recipe_ids is not None:
+            self.stats.hit()
+            return recipe_ids
+        self.stats.miss()
+        recipe_ids = frozenset(self._queryset(user_id, kind))
+        cache.set(key, recipe_ids, settings.RECIPE_SETS_CACHE_TIMEOUT)
+        return recipe_ids
+
+    async def aget(self, user_id, kind):
+        if not settings.SHARED_CACHE:
+            return frozenset([pk async for pk in self._queryset(user_id, kind)])
+        key = self._key(user_id, kind)
+        recipe_ids = await cache.aget(key)
+        if recipe_ids is not None:
+            self.stats.hit()
+            return recipe_ids
+        self.stats.miss()
+        recipe_ids = frozenset([pk async for pk in self._queryset(user_id, kind)])
+        await cache.aset(key, recipe_ids, settings.RECIPE_SETS_CACHE_TIMEOUT)
+        return recipe_ids
+
+    @staticmethod
+    def _queryset(user_id, kind):
+        return RELATION_MODELS[kind].objects.filter(user_id=user_id).values_list('recipe_id', flat=True)
+
+    @staticmethod
+    def _key(user_id, kind):
+        token, _ = versions.get_version(versions.relations(user_id))
+        return f'recipe-set:{kind}:{user_id}:{token}'
+
+
+recipe_sets = RecipeSetCache()
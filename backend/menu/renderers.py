@@ -0,0 +1,21 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer, кодирующий компактный JSON через orjson.
+
+    Для данных без чисел с плавающей точкой вывод совпадает с JSONRenderer побайтно.
+    Отступы из заголовка Accept, ensure_ascii и данные, которые orjson не кодирует,
+    обрабатываются родительским классом.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
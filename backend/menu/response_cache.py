@@ -0,0 +1,63 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from menu import versions
+from menu.cache_stats import CacheStats
+
+
+class AnonymousResponseCache:
+    """Кэш данных ответов для анонимных пользователей.
+
+    Ключ включает версии рецептов и ингредиентов, поэтому любое изменение
+    делает старые записи недостижимыми без перебора ключей. Без общего кэша
+    (SHARED_CACHE) процессы не видели бы чужих версий, и ответы не кэшируются.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.stats = CacheStats('responses')
+
+    def get_or_render(self, request, render):
+        if not settings.SHARED_CACHE:
+            return render()
+        key = self._key(request)
+        data = cache.get(key)
+        if data is not None:
+            self.stats.hit()
+            return Response(data)
+        self.stats.miss()
+        response = render()
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    async def aget_or_render(self, request, render):
+        if not settings.SHARED_CACHE:
+            return await render()
+        key = self._key(request)
+        data = await cache.aget(key)
+        if data is not None:
+            self.stats.hit()
+            return Response(data)
+        self.stats.miss()
+        response = await render()
+        if response.status_code == 200:
+            await cache.aset(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def _key(self, request):
+        source = repr((
+            versions.get_version(versions.RECIPES)[0],
+            versions.get_version(versions.INGREDIENTS)[0],
+            request.scheme,
+            request.get_host(),
+            request.path,
+            sorted((name, sorted(values)) for name, values in request.query_params.lists()),
+        ))
+        return f'{self.prefix}:{hashlib.md5(source.encode()).hexdigest()}'
+
+
+recipe_response_cache = AnonymousResponseCache('recipe-response')
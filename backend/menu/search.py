@@ -0,0 +1,83 @@
+from django.db import connection
+from django.db.models import F, Q
+
+from menu.stemmer import stem_words
+
+
+class SearchBackend:
+    """Поиск рецептов по названию и описанию без полнотекстового индекса."""
+
+    def search(self, queryset, query):
+        words = query.split()
+        if not words:
+            return queryset.none()
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return queryset.filter(condition)
+
+    def index(self, recipe):
+        pass
+
+    def index_many(self, recipes):
+        self.index_rows((recipe.pk, recipe.name, recipe.text) for recipe in recipes)
+
+    def index_rows(self, rows):
+        """Индексирует рецепты, заданные кортежами (id, название, описание)."""
+
+    def remove(self, pk):
+        pass
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """Поиск через таблицу FTS5 menu_recipe_fts с основами слов и ранжированием bm25.
+
+    Каждое слово запроса ищется по префиксу основы, название весит больше описания.
+    """
+    table = 'menu_recipe_fts'
+
+    def search(self, queryset, query):
+        stems = stem_words(query)
+        if not stems:
+            return queryset.none()
+        match = ' '.join(f'"{word}"*' for word in stems)
+        return queryset.filter(search_document__document__match=match).annotate(
+            search_rank=F('search_document__rank')
+        ).order_by('search_rank', '-pub_date', '-id')
+
+    def index(self, recipe):
+        self.index_many([recipe])
+
+    def index_rows(self, rows):
+        rows = [(pk, ' '.join(stem_words(name)), ' '.join(stem_words(text))) for pk, name, text in rows]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [row[:1] for row in rows])
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, name, text) VALUES (%s, %s, %s)', rows)
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Поиск через tsvector с русской конфигурацией; вектор пока строится на лету."""
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        vector = (SearchVector('name', weight='A', config='russian')
+                  + SearchVector('text', weight='B', config='russian'))
+        search_query = SearchQuery(query, config='russian', search_type='websearch')
+        return queryset.annotate(search_vector=vector).filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, SearchBackend)()
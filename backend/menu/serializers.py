@@ -1,17 +1,18 @@
-import base64
-import uuid
-
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
 from rest_framework.exceptions import PermissionDenied
 
+from menu.bulk import delete_by_pk
+from menu.images import ImageDecodeError, decode_base64_image
 from menu.models import Ingredient
+from menu.recipe_ingredient_index import recipe_ingredient_index
 from rest_framework import serializers
 
+from my_user.models import SubscriptionRelation
 from my_user.serializers import UserSerializer
 from myproject.settings import MIN_TIME, MAX_TIME
 from .models import Recipe, RecipeIngredient, FavoriteRelation, ShoppingCartRelation
 from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value, prefetch_related_objects
 
 User = get_user_model()
 
@@ -49,16 +50,125 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'cooking_time')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        if 'favorited_ids' in self.context:
+            return obj.id in self.context['favorited_ids']
         user = self.context['request'].user
         return user.favorites.filter(recipe=obj).exists() if not user.is_anonymous else False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        if 'shopping_cart_ids' in self.context:
+            return obj.id in self.context['shopping_cart_ids']
         user = self.context['request'].user
         return user.shopping_cart.filter(recipe=obj).exists() if not user.is_anonymous else False
 
 
+class RecipeRowSerializer:
+    """Быстрый аналог RecipeListSerializer(many=True) только для чтения.
+
+    Принимает строки values_list(*fields, named=True) и строит те же словари без полей DRF;
+    ингредиенты и авторы читаются двумя запросами values_list. Если множеств favorited_ids и
+    shopping_cart_ids нет в контексте, они читаются из базы только для рецептов страницы.
+    """
+    fields = ('pk', 'author_id', 'name', 'image', 'text', 'cooking_time', 'pub_date')
+    author_fields = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar')
+    ingredient_fields = ('recipe_id', 'ingredient_id', 'ingredient__name', 'ingredient__measurement_unit', 'amount')
+    relation_models = {'favorited_ids': FavoriteRelation, 'shopping_cart_ids': ShoppingCartRelation}
+
+    def __init__(self, instance, many=True, context=None):
+        self.instance = instance
+        self.context = context or {}
+
+    @property
+    def data(self):
+        rows = list(self.instance)
+        self.context.update({key: frozenset(queryset) for key, queryset in self.get_relations(rows).items()})
+        return self.build(rows, list(self.get_ingredients(rows)), list(self.get_authors(rows)))
+
+    async def adata(self):
+        rows = list(self.instance)
+        for key, queryset in self.get_relations(rows).items():
+            self.context[key] = frozenset([pk async for pk in queryset])
+        ingredients = [row async for row in self.get_ingredients(rows)]
+        return self.build(rows, ingredients, [row async for row in self.get_authors(rows)])
+
+    def get_relations(self, rows):
+        user = self.context['request'].user
+        if not user.is_authenticated:
+            return {}
+        return {
+            key: model.objects.filter(
+                user=user, recipe_id__in=[row.pk for row in rows]
+            ).values_list('recipe_id', flat=True)
+            for key, model in self.relation_models.items() if key not in self.context
+        }
+
+    def get_ingredients(self, rows):
+        return RecipeIngredient.objects.filter(
+            recipe_id__in=[row.pk for row in rows]
+        ).values_list(*self.ingredient_fields)
+
+    def get_authors(self, rows):
+        authors = User.objects.filter(pk__in={row.author_id for row in rows})
+        user = self.context['request'].user
+        if user.is_authenticated:
+            is_subscribed = Exists(SubscriptionRelation.objects.filter(sender=user, to=OuterRef('pk')))
+        else:
+            is_subscribed = Value(False, output_field=BooleanField())
+        return authors.annotate(is_subscribed=is_subscribed).values_list(*self.author_fields, 'is_subscribed')
+
+    def build(self, rows, ingredient_rows, author_rows):
+        favorited_ids = self.context.get('favorited_ids', frozenset())
+        shopping_cart_ids = self.context.get('shopping_cart_ids', frozenset())
+        ingredients = {}
+        for recipe_id, pk, name, measurement_unit, amount in ingredient_rows:
+            ingredients.setdefault(recipe_id, []).append(
+                {'id': pk, 'name': name, 'measurement_unit': measurement_unit, 'amount': amount}
+            )
+        avatar_storage = User._meta.get_field('avatar').storage
+        authors = {}
+        for pk, email, username, first_name, last_name, avatar, is_subscribed in author_rows:
+            authors[pk] = {
+                'id': pk, 'email': email, 'username': username, 'first_name': first_name, 'last_name': last_name,
+                'avatar': self.file_url(avatar_storage, avatar), 'is_subscribed': is_subscribed,
+            }
+        image_storage = Recipe._meta.get_field('image').storage
+        return [
+            {
+                'id': row.pk,
+                'author': authors.get(row.author_id),
+                'ingredients': ingredients.get(row.pk, []),
+                'is_favorited': row.pk in favorited_ids,
+                'is_in_shopping_cart': row.pk in shopping_cart_ids,
+                'name': row.name,
+                'image': self.file_url(image_storage, row.image),
+                'text': row.text,
+                'cooking_time': row.cooking_time,
+            }
+            for row in rows
+        ]
+
+    def file_url(self, storage, name):
+        if not name:
+            return None
+        url = storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
+
+
 class RecipeIngredientWriteSerializer(serializers.Serializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(min_value=MIN_TIME,
                                       max_value=MAX_TIME, )
 
@@ -66,11 +176,10 @@ class RecipeIngredientWriteSerializer(serializers.Serializer):
 class BaseImageSerializerField(serializers.Field):
     def to_internal_value(self, data):
         try:
-            format_, imgstr = data.split(';base64,')
-            ext = format_.split('/')[-1]
-            return ContentFile(base64.b64decode(imgstr), name=f'{uuid.uuid4()}.{ext}')
-        except:
-            raise serializers.ValidationError()
+            current = getattr(self.parent.instance, self.source, None) if self.parent.instance else None
+            return decode_base64_image(data, current.name if current else None)
+        except ImageDecodeError as error:
+            raise serializers.ValidationError(str(error))
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
@@ -90,7 +199,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
         recipe = Recipe.objects.create(
             author=self.context['request'].user,
-            image=image,
+            image=image.save(),
             **validated_data
         )
         self._add_ingredients(recipe, ingredients)
@@ -103,11 +212,15 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         if 'ingredients' not in validated_data:
             raise serializers.ValidationError()
         ingredients = validated_data.pop('ingredients')
-        instance.recipe_ingredients.all().delete()
-        self._add_ingredients(instance, ingredients)
+        self._update_ingredients(instance, ingredients)
+        if 'image' in validated_data:
+            validated_data['image'] = validated_data['image'].save()
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], Prefetch(
+            'recipe_ingredients', queryset=RecipeIngredient.objects.select_related('ingredient')
+        ))
         return RecipeListSerializer(instance,
                                     context={'request': self.context['request']}).data
 
@@ -119,6 +232,12 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             if not ingredient.get('id') or (ingredient['id'] in ingredients_list):
                 raise serializers.ValidationError
             ingredients_list.add(ingredient['id'])
+        found = Ingredient.objects.in_bulk(ingredients_list)
+        missing = ingredients_list - found.keys()
+        if missing:
+            raise serializers.ValidationError(f'Ингредиенты не найдены: {", ".join(map(str, sorted(missing)))}')
+        for ingredient in value:
+            ingredient['id'] = found[ingredient['id']]
         return value
 
     def _add_ingredients(self, recipe, ingredients):
@@ -131,6 +250,33 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             for ingredient in ingredients
         ]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        self._reindex_ingredients(recipe, [ingredient['id'].pk for ingredient in ingredients])
+
+    def _update_ingredients(self, recipe, ingredients):
+        """Приводит ингредиенты рецепта к новому списку, меняя только отличающиеся строки."""
+        current = {item.ingredient_id: item for item in recipe.recipe_ingredients.all()}
+        amounts = {ingredient['id'].pk: ingredient['amount'] for ingredient in ingredients}
+        removed = [item.pk for pk, item in current.items() if pk not in amounts]
+        changed = []
+        for pk, item in current.items():
+            if pk in amounts and item.amount != amounts[pk]:
+                item.amount = amounts[pk]
+                changed.append(item)
+        added = [
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=amount)
+            for pk, amount in amounts.items() if pk not in current
+        ]
+        if removed:
+            delete_by_pk(RecipeIngredient, removed)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        if removed or added:
+            self._reindex_ingredients(recipe, list(amounts))
+
+    def _reindex_ingredients(self, recipe, ingredient_ids):
+        transaction.on_commit(lambda: recipe_ingredient_index.set_recipe(recipe.pk, ingredient_ids))
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
@@ -139,6 +285,14 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class RecipeMatchSerializer(RecipeShortSerializer):
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    total_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + ('matched_ingredients', 'total_ingredients')
+
+
 class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCartRelation
@@ -162,7 +316,6 @@ class FavoriteSerializer(serializers.ModelSerializer):
 class SubscribedSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count', read_only=True)
 
     class Meta:
         model = User
@@ -172,14 +325,26 @@ class SubscribedSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context['request'].user.is_authenticated:
             return self.context['request'].user.sub_sender.filter(to=obj).exists()
         return False
 
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()
-        recipes_limit = self.context.get('request').query_params.get('recipes_limit') if self.context.get('request') else None
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         serializer = RecipeShortSerializer(recipes, many=True, read_only=True, context=self.context)
         return serializer.data
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit') if request else None
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
@@ -0,0 +1,36 @@
+import csv
+import json
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def render_txt(rows):
+    yield 'Список покупок:\n\n'
+    for name, unit, amount in rows:
+        yield f'{name} - {amount} {unit}\n'
+
+
+def render_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_json(rows):
+    separator = '['
+    for name, unit, amount in rows:
+        yield separator + json.dumps({'name': name, 'measurement_unit': unit, 'amount': amount},
+                                     ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+RENDERERS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+}
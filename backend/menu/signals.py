@@ -0,0 +1,161 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from menu.ingredient_index import ingredient_index
+from menu import versions
+from menu.middleware import record_query
+from menu.models import FavoriteRelation, Ingredient, Recipe, RecipeIngredient, ShoppingCartRelation, ShortLink
+from menu.recipe_ingredient_index import recipe_ingredient_index
+from menu.search import get_search_backend
+from my_user.authentication import token_cache
+from my_user.models import SubscriptionRelation
+
+User = get_user_model()
+
+RECIPE_COUNTERS = ((FavoriteRelation, 'favorites_count'), (ShoppingCartRelation, 'in_carts_count'))
+
+
+def bump_version_on_commit(name):
+    transaction.on_commit(lambda: versions.bump_version(name))
+
+
+def deleted_with(origin, model):
+    """Удаление начато с объекта или выборки model и строка удаляется каскадом вместе с ними."""
+    if isinstance(origin, QuerySet):
+        return issubclass(origin.model, model)
+    return isinstance(origin, model)
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_index(sender, instance, **kwargs):
+    ingredient_index.add(instance)
+    bump_version_on_commit(versions.INGREDIENTS)
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_from_ingredient_index(sender, instance, **kwargs):
+    pk = instance.pk
+    ingredient_index.remove(pk)
+    transaction.on_commit(lambda: recipe_ingredient_index.remove_ingredient(pk))
+    bump_version_on_commit(versions.INGREDIENTS)
+
+
+@receiver(post_delete, sender=ShortLink)
+def drop_cached_short_link(sender, instance, **kwargs):
+    cache.delete(ShortLink.cache_key(instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def bump_recipes_version(sender, **kwargs):
+    bump_version_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_for_search(sender, instance, **kwargs):
+    get_search_backend().index(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search(sender, instance, **kwargs):
+    pk = instance.pk
+    get_search_backend().remove(pk)
+    transaction.on_commit(lambda: recipe_ingredient_index.remove_recipe(pk))
+
+
+@receiver(post_save, sender=User)
+def bump_recipes_version_on_author_change(sender, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_version_on_commit(versions.RECIPES)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: token_cache.invalidate_user(pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.invalidate(key))
+
+
+@receiver(post_save, sender=FavoriteRelation)
+@receiver(post_delete, sender=FavoriteRelation)
+@receiver(post_save, sender=ShoppingCartRelation)
+@receiver(post_delete, sender=ShoppingCartRelation)
+def bump_relations_version(sender, instance, **kwargs):
+    bump_version_on_commit(versions.relations(instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+def increment_author_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(recipes_count=F('recipes_count') + 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_author_recipes_count(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, User):
+        return
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(recipes_count=F('recipes_count') - 1)
+
+
+@receiver(post_save, sender=FavoriteRelation)
+@receiver(post_save, sender=ShoppingCartRelation)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        field = dict(RECIPE_COUNTERS)[sender]
+        Recipe.objects.filter(pk=instance.recipe_id).update(**{field: F(field) + 1})
+
+
+@receiver(post_delete, sender=FavoriteRelation)
+@receiver(post_delete, sender=ShoppingCartRelation)
+def decrement_recipe_counter(sender, instance, origin=None, **kwargs):
+    if deleted_with(origin, Recipe) or deleted_with(origin, User):
+        return
+    field = dict(RECIPE_COUNTERS)[sender]
+    Recipe.objects.filter(pk=instance.recipe_id, **{f'{field}__gt': 0}).update(**{field: F(field) - 1})
+
+
+@receiver(pre_delete, sender=User)
+def decrement_counters_of_user_relations(sender, instance, **kwargs):
+    """Уменьшает счётчики рецептов, связанных с удаляемым пользователем, одним UPDATE на модель связей.
+
+    Сами связи удаляются каскадом, и их post_delete счётчики не трогает.
+    """
+    for model, field in RECIPE_COUNTERS:
+        Recipe.objects.filter(
+            pk__in=model.objects.filter(user=instance).values('recipe_id'), **{f'{field}__gt': 0},
+        ).exclude(author=instance).update(**{field: F(field) - 1})
+
+
+@receiver(post_save, sender=SubscriptionRelation)
+@receiver(post_delete, sender=SubscriptionRelation)
+def bump_subscriptions_version(sender, instance, **kwargs):
+    bump_version_on_commit(versions.relations(instance.sender_id))
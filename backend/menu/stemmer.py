@@ -0,0 +1,72 @@
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+PERFECTIVE_GERUND_RE = re.compile(r'(?:(?<=[ая])(?:в|вши|вшись)|ив|ивши|ившись|ыв|ывши|ывшись)$')
+REFLEXIVE_RE = re.compile(r'(?:ся|сь)$')
+ADJECTIVE_RE = re.compile(r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому'
+                          r'|их|ых|ую|юю|ая|яя|ою|ею)$')
+PARTICIPLE_RE = re.compile(r'(?:(?<=[ая])(?:ем|нн|вш|ющ|щ)|ивш|ывш|ующ)$')
+VERB_RE = re.compile(r'(?:(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)'
+                     r'|ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют'
+                     r'|ит|ыт|ены|ить|ыть|ишь|ую|ю)$')
+NOUN_RE = re.compile(r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у'
+                     r'|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+SUPERLATIVE_RE = re.compile(r'(?:ейше|ейш)$')
+DERIVATIONAL_RE = re.compile(r'(?:ость|ост)$')
+
+
+def _region_after_vowel_pair(word, start=0):
+    for position in range(start + 1, len(word)):
+        if word[position] not in VOWELS and word[position - 1] in VOWELS:
+            return position + 1
+    return len(word)
+
+
+def _cut(regex, text):
+    match = regex.search(text)
+    return (text[:match.start()], True) if match else (text, False)
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball (Портер для русского языка)."""
+    word = word.lower().replace('ё', 'е')
+    rv_start = next((position + 1 for position, letter in enumerate(word) if letter in VOWELS), len(word))
+    r2_start = _region_after_vowel_pair(word, _region_after_vowel_pair(word))
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    rv, removed = _cut(PERFECTIVE_GERUND_RE, rv)
+    if not removed:
+        rv, _ = _cut(REFLEXIVE_RE, rv)
+        rv, removed = _cut(ADJECTIVE_RE, rv)
+        if removed:
+            rv, _ = _cut(PARTICIPLE_RE, rv)
+        else:
+            rv, removed = _cut(VERB_RE, rv)
+            if not removed:
+                rv, _ = _cut(NOUN_RE, rv)
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    match = DERIVATIONAL_RE.search(rv)
+    if match and rv_start + match.start() >= r2_start:
+        rv = rv[:match.start()]
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv, removed = _cut(SUPERLATIVE_RE, rv)
+        if removed and rv.endswith('нн'):
+            rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def stem_words(text):
+    """Список основ всех слов текста."""
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
@@ -0,0 +1,1236 @@
+import asyncio
+import base64
+import io
+import itertools
+import json
+import pickle
+import tempfile
+import threading
+import time
+import warnings
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from menu.async_views import async_read_view
+from menu.counters import count_of
+from menu.db_router import read_from_replica
+from menu.ingredient_index import ingredient_index
+from menu.middleware import ConcurrencyLimitMiddleware, ReplicaRoutingMiddleware
+from menu.models import (FavoriteRelation, Ingredient, Recipe, RecipeIngredient, RecipeSearchDocument,
+                         ShoppingCartRelation, ShortLink)
+from menu.query_plans import collect_plans, explain, full_scans, hot_urls
+from menu.recipe_ingredient_index import RecipeIngredientIndex, recipe_ingredient_index
+from menu.recipe_sets import FAVORITES, SHOPPING_CART, recipe_sets
+from menu.renderers import ORJSONRenderer
+from menu.response_cache import recipe_response_cache
+from menu.serializers import RecipeListSerializer, RecipeRowSerializer
+from menu.stemmer import stem, stem_words
+from menu.views import RecipeViewSet
+from my_user.authentication import TokenCache, token_cache
+from my_user.models import SubscriptionRelation
+
+User = get_user_model()
+
+
+def create_user(name):
+    return User.objects.create_user(email=f'{name}@example.com', username=name, first_name=name,
+                                    last_name=name, password='test-password-1')
+
+
+def create_recipe(author, ingredients, name='рецепт', cooking_time=10, text='описание'):
+    recipe = Recipe.objects.create(author=author, name=name, text=text, image='recipes/test.png',
+                                   cooking_time=cooking_time)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for amount, ingredient in enumerate(ingredients, start=1)
+    )
+    return recipe
+
+
+def png_data_uri(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def token_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+    return client
+
+
+class RecipeDataMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = [Ingredient.objects.create(name=f'ингредиент {i}', measurement_unit='г') for i in range(4)]
+        cls.reader = create_user('reader')
+        cls.authors = [create_user(f'author{i}') for i in range(5)]
+        cls.recipes = [
+            create_recipe(cls.authors[i % len(cls.authors)], cls.ingredients[:1 + i % 4], name=f'рецепт {i}')
+            for i in range(12)
+        ]
+        for recipe in cls.recipes[::2]:
+            FavoriteRelation.objects.create(user=cls.reader, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCartRelation.objects.create(user=cls.reader, recipe=recipe)
+        for author in cls.authors[:2]:
+            SubscriptionRelation.objects.create(sender=cls.reader, to=author)
+
+    def setUp(self):
+        cache.clear()
+
+
+class RecipeListQueryCountTests(RecipeDataMixin, TestCase):
+    def count_queries(self, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_constant_queries(self, client, template):
+        counts = {limit: self.count_queries(client, template.format(limit=limit)) for limit in (1, 5, 12)}
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_anonymous_list_does_not_depend_on_page_size(self):
+        self.assert_constant_queries(APIClient(), '/api/recipes/?limit={limit}')
+
+    def test_authenticated_list_does_not_depend_on_page_size(self):
+        self.assert_constant_queries(token_client(self.reader), '/api/recipes/?limit={limit}')
+
+    def test_filtered_list_does_not_depend_on_page_size(self):
+        client = token_client(self.reader)
+        self.assert_constant_queries(client, '/api/recipes/?limit={limit}&is_favorited=1')
+        self.assert_constant_queries(client, '/api/recipes/?limit={limit}&is_in_shopping_cart=1')
+
+    def test_cursor_list_does_not_depend_on_page_size(self):
+        self.assert_constant_queries(token_client(self.reader), '/api/recipes/?limit={limit}&cursor=')
+
+    def test_list_flags_match_relations(self):
+        response = token_client(self.reader).get('/api/recipes/?limit=100')
+        results = {recipe['id']: recipe for recipe in response.json()['results']}
+        self.assertEqual(len(results), len(self.recipes))
+        for index, recipe in enumerate(self.recipes):
+            data = results[recipe.pk]
+            self.assertEqual(data['is_favorited'], index % 2 == 0)
+            self.assertEqual(data['is_in_shopping_cart'], index % 3 == 0)
+            self.assertEqual(data['author']['is_subscribed'], recipe.author in self.authors[:2])
+            self.assertEqual(len(data['ingredients']), 1 + index % 4)
+
+    def test_relations_are_read_only_for_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            token_client(self.reader).get('/api/recipes/?limit=2')
+        relation_queries = [query['sql'] for query in queries
+                            if 'menu_favoriterelation' in query['sql'] or 'menu_shoppingcartrelation' in query['sql']]
+        self.assertEqual(len(relation_queries), 2)
+        for sql in relation_queries:
+            self.assertIn('"recipe_id" IN (', sql)
+
+    def test_detail_flags_match_relations(self):
+        client = token_client(self.reader)
+        for index in (0, 1, 3):
+            data = client.get(f'/api/recipes/{self.recipes[index].pk}/').json()
+            self.assertEqual((data['is_favorited'], data['is_in_shopping_cart']), (index % 2 == 0, index % 3 == 0))
+
+
+@override_settings(SHARED_CACHE=True)
+class RecipeSetCacheTests(RecipeDataMixin, TestCase):
+    def ids(self, recipes):
+        return frozenset(recipe.pk for recipe in recipes)
+
+    def test_bulk_add_and_remove_replace_cached_set(self):
+        client = token_client(self.reader)
+        self.assertEqual(recipe_sets.get(self.reader.pk, FAVORITES), self.ids(self.recipes[::2]))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/recipes/favorite/', {'recipes': [r.pk for r in self.recipes[1::2]]},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(recipe_sets.get(self.reader.pk, FAVORITES), self.ids(self.recipes))
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete('/api/recipes/favorite/', {'recipes': [r.pk for r in self.recipes[:6]]}, format='json')
+        self.assertEqual(recipe_sets.get(self.reader.pk, FAVORITES), self.ids(self.recipes[6:]))
+
+    def test_single_toggle_replaces_cached_set(self):
+        client = token_client(self.reader)
+        recipe = self.recipes[1]
+        self.assertNotIn(recipe.pk, recipe_sets.get(self.reader.pk, SHOPPING_CART))
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertIn(recipe.pk, recipe_sets.get(self.reader.pk, SHOPPING_CART))
+        with self.captureOnCommitCallbacks(execute=True):
+            client.delete(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertNotIn(recipe.pk, recipe_sets.get(self.reader.pk, SHOPPING_CART))
+
+    def test_cascade_delete_of_recipe_replaces_cached_sets(self):
+        recipe = self.recipes[0]
+        for kind in (FAVORITES, SHOPPING_CART):
+            self.assertIn(recipe.pk, recipe_sets.get(self.reader.pk, kind))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = token_client(recipe.author).delete(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        for kind in (FAVORITES, SHOPPING_CART):
+            self.assertNotIn(recipe.pk, recipe_sets.get(self.reader.pk, kind))
+
+    def test_set_read_before_change_is_not_reused(self):
+        stale_key = recipe_sets._key(self.reader.pk, FAVORITES)
+        stale = recipe_sets.get(self.reader.pk, FAVORITES)
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteRelation.objects.create(user=self.reader, recipe=self.recipes[1])
+        cache.set(stale_key, stale)
+        self.assertIn(self.recipes[1].pk, recipe_sets.get(self.reader.pk, FAVORITES))
+
+    @override_settings(SHARED_CACHE=False)
+    def test_without_shared_cache_sets_are_read_from_database(self):
+        recipe_sets.get(self.reader.pk, FAVORITES)
+        FavoriteRelation.objects.create(user=self.reader, recipe=self.recipes[1])
+        self.assertIn(self.recipes[1].pk, recipe_sets.get(self.reader.pk, FAVORITES))
+
+    @override_settings(CACHE_STATS_LOG_INTERVAL=1)
+    def test_hit_ratio_is_logged(self):
+        with self.assertLogs('menu.cache', 'INFO') as logs:
+            recipe_sets.get(self.reader.pk, FAVORITES)
+            recipe_sets.get(self.reader.pk, FAVORITES)
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual([record['cache'] for record in records], ['recipe_sets', 'recipe_sets'])
+        self.assertEqual(records[1]['hits'] - records[0]['hits'], 1)
+        self.assertIn('hit_ratio', records[1])
+
+
+@override_settings(SHARED_CACHE=True)
+class ConditionalGetTests(RecipeDataMixin, TestCase):
+    def assert_changed(self, client, url, change):
+        etag = client.get(url)['ETag']
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def edit_recipe(self, recipe):
+        response = token_client(recipe.author).patch(f'/api/recipes/{recipe.pk}/', {
+            'name': 'новое название', 'ingredients': [{'id': self.ingredients[0].pk, 'amount': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_recipe_edit_changes_list_and_detail_etag(self):
+        recipe = self.recipes[0]
+        for url in ('/api/recipes/', '/api/recipes/?cursor=', f'/api/recipes/{recipe.pk}/'):
+            with self.subTest(url=url):
+                self.assert_changed(APIClient(), url, lambda: self.edit_recipe(recipe))
+
+    def test_favorite_changes_authenticated_list_etag(self):
+        client = token_client(self.reader)
+        recipe = self.recipes[1]
+        self.assert_changed(client, '/api/recipes/', lambda: client.post(f'/api/recipes/{recipe.pk}/favorite/'))
+
+    def test_ingredient_change_changes_ingredient_etag(self):
+        self.assert_changed(APIClient(), '/api/ingredients/',
+                            lambda: Ingredient.objects.create(name='перец', measurement_unit='г'))
+
+    def test_cursor_list_does_not_count_recipes(self):
+        client = token_client(self.reader)
+        first = client.get('/api/recipes/?cursor=&limit=5')
+        for url in ('/api/recipes/?cursor=&limit=5', first.json()['next']):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('ETag', response)
+            self.assertFalse([query['sql'] for query in queries if 'COUNT(' in query['sql'].upper()])
+
+    @override_settings(SHARED_CACHE=False)
+    def test_without_shared_cache_validators_are_not_sent(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipes[0].pk}/', '/api/ingredients/'):
+            with self.subTest(url=url):
+                response = APIClient().get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+
+@override_settings(SHARED_CACHE=True)
+class AnonymousResponseCacheTests(RecipeDataMixin, TestCase):
+    def names(self, url):
+        data = APIClient().get(url).json()
+        return {recipe['name'] for recipe in data['results']} if 'results' in data else {data['name']}
+
+    def test_write_replaces_cached_pages(self):
+        recipe = self.recipes[0]
+        urls = ('/api/recipes/?limit=100', f'/api/recipes/{recipe.pk}/')
+        for url in urls:
+            self.names(url)
+        hits = recipe_response_cache.stats.hits
+        for url in urls:
+            self.assertIn(recipe.name, self.names(url))
+        self.assertEqual(recipe_response_cache.stats.hits, hits + len(urls))
+        with self.captureOnCommitCallbacks(execute=True):
+            token_client(recipe.author).patch(f'/api/recipes/{recipe.pk}/', {
+                'name': 'новое название', 'ingredients': [{'id': self.ingredients[0].pk, 'amount': 3}],
+            }, format='json')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIn('новое название', self.names(url))
+                self.assertNotIn(recipe.name, self.names(url))
+
+    def test_author_change_replaces_cached_pages(self):
+        author = self.recipes[0].author
+        self.names('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            author.first_name = 'новое имя'
+            author.save()
+        authors = {recipe['author']['first_name'] for recipe in APIClient().get('/api/recipes/').json()['results']}
+        self.assertIn('новое имя', authors)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_without_shared_cache_responses_are_not_cached(self):
+        hits = recipe_response_cache.stats.hits
+        for _ in range(2):
+            self.names('/api/recipes/')
+        self.assertEqual(recipe_response_cache.stats.hits, hits)
+
+    @override_settings(CACHE_STATS_LOG_INTERVAL=1)
+    def test_hit_ratio_is_logged(self):
+        with self.assertLogs('menu.cache', 'INFO') as logs:
+            for _ in range(2):
+                self.names('/api/recipes/')
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertEqual({record['cache'] for record in records}, {'responses'})
+        self.assertEqual(records[-1]['hits'] - records[0]['hits'], 1)
+
+
+class RecipeCounterTests(RecipeDataMixin, TestCase):
+    def test_saving_stale_instances_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipes[1].pk)
+        author = User.objects.get(pk=recipe.author_id)
+        FavoriteRelation.objects.create(user=self.reader, recipe=recipe)
+        ShoppingCartRelation.objects.create(user=self.reader, recipe=recipe)
+        create_recipe(author, self.ingredients[:1])
+        recipe.name = 'новое название'
+        recipe.save()
+        author.first_name = 'новое имя'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual((recipe.name, recipe.favorites_count, recipe.in_carts_count), ('новое название', 1, 1))
+        self.assertEqual((author.first_name, author.recipes_count), ('новое имя', author.recipes.count()))
+
+    def assertCountersMatchRelations(self):
+        recipes = Recipe.objects.annotate(
+            favorites_total=count_of(FavoriteRelation, 'recipe'),
+            in_carts_total=count_of(ShoppingCartRelation, 'recipe'),
+        ).values_list('favorites_count', 'in_carts_count', 'favorites_total', 'in_carts_total')
+        self.assertTrue(all(counters[:2] == counters[2:] for counters in recipes))
+        authors = User.objects.annotate(recipes_total=count_of(Recipe, 'author')).values_list(
+            'recipes_count', 'recipes_total')
+        self.assertTrue(all(count == total for count, total in authors))
+
+    def test_recipe_delete_does_not_update_counters_per_relation(self):
+        recipe = self.recipes[0]
+        fans = User.objects.bulk_create(User(email=f'fan{i}@example.com', username=f'fan{i}') for i in range(60))
+        for user in fans:
+            FavoriteRelation.objects.create(user=user, recipe=recipe)
+            ShoppingCartRelation.objects.create(user=user, recipe=recipe)
+        with CaptureQueriesContext(connection) as queries:
+            recipe.delete()
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "menu_recipe"')]
+        self.assertEqual(updates, [])
+        self.assertLess(len(queries), 20)
+        self.assertCountersMatchRelations()
+
+    def test_user_delete_recounts_related_recipes_at_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.reader.delete()
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "menu_recipe"')]
+        self.assertEqual(len(updates), 2)
+        self.assertCountersMatchRelations()
+
+    def test_author_delete_keeps_other_counters(self):
+        FavoriteRelation.objects.create(user=self.authors[0], recipe=self.recipes[1])
+        self.authors[0].delete()
+        self.assertCountersMatchRelations()
+        self.assertEqual(Recipe.objects.get(pk=self.recipes[1].pk).favorites_count, 0)
+
+
+class ConcurrentCounterTests(TransactionTestCase):
+    @staticmethod
+    def send_until_unlocked(method, url):
+        while True:
+            try:
+                return method(url)
+            except OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                time.sleep(0.001)
+
+    def test_parallel_favorite_toggles_keep_counters(self):
+        ingredient = Ingredient.objects.create(name='соль', measurement_unit='г')
+        author = create_user('author')
+        recipes = [create_recipe(author, [ingredient], name=f'рецепт {i}') for i in range(3)]
+        clients = [token_client(create_user(f'reader{i}')) for i in range(6)]
+        barrier = threading.Barrier(len(clients))
+        errors = []
+
+        def toggle(client, number):
+            try:
+                barrier.wait(10)
+                for step in range(4):
+                    for kind in ('favorite', 'shopping_cart'):
+                        url = f'/api/recipes/{recipes[(number + step) % len(recipes)].pk}/{kind}/'
+                        for method in (client.post, client.delete, client.post):
+                            self.send_until_unlocked(method, url)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=toggle, args=(client, number)) for number, client in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        counters = Recipe.objects.annotate(
+            favorites_total=count_of(FavoriteRelation, 'recipe'),
+            in_carts_total=count_of(ShoppingCartRelation, 'recipe'),
+        ).values_list('favorites_count', 'in_carts_count', 'favorites_total', 'in_carts_total', named=True)
+        for recipe in counters:
+            self.assertEqual((recipe.favorites_count, recipe.in_carts_count),
+                             (recipe.favorites_total, recipe.in_carts_total))
+        self.assertGreater(sum(recipe.favorites_count for recipe in counters), 0)
+
+
+class RecipeIngredientIndexRefreshTests(TransactionTestCase):
+    def setUp(self):
+        self.ingredients = [Ingredient.objects.create(name=f'ингредиент {i}', measurement_unit='г') for i in range(2)]
+        author = create_user('author')
+        self.recipes = [create_recipe(author, self.ingredients[:1 + i % 2]) for i in range(3)]
+        self.index = RecipeIngredientIndex()
+        self.index.match([self.ingredients[0].pk], 10)
+
+    def refresh(self, during_build):
+        build = self.index._build
+
+        def build_and_change():
+            snapshot = build()
+            during_build()
+            return snapshot
+
+        with mock.patch.object(self.index, '_build', build_and_change):
+            self.index._start_refresh()
+            for _ in range(1000):
+                if not self.index._refreshing:
+                    break
+                time.sleep(0.01)
+        self.assertFalse(self.index._refreshing)
+
+    def matched(self, ingredient):
+        return {pk for pk, _, _ in self.index.match([ingredient.pk], 10)}
+
+    def test_updates_during_refresh_are_applied_to_new_snapshot(self):
+        first, second = self.ingredients
+
+        def change():
+            self.index.set_recipe(self.recipes[0].pk, [second.pk])
+            self.index.remove_recipe(self.recipes[1].pk)
+
+        self.refresh(change)
+        self.assertEqual(self.matched(first), {self.recipes[2].pk})
+        self.assertEqual(self.matched(second), {self.recipes[0].pk})
+
+    def test_invalidate_during_refresh_discards_it(self):
+        self.refresh(self.index.invalidate)
+        self.assertIsNone(self.index._snapshot)
+
+
+class RecipeWriteMixin(RecipeDataMixin):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = Path(media_root.name)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.client = token_client(self.authors[0])
+
+    def payload(self, image, **fields):
+        return {'name': 'новый рецепт', 'text': 'описание', 'cooking_time': 5, 'image': image,
+                'ingredients': [{'id': self.ingredients[0].pk, 'amount': 10}], **fields}
+
+    def stored_files(self):
+        return sorted(path.name for path in self.media_root.rglob('*') if path.is_file())
+
+
+class RecipeImageTests(RecipeWriteMixin, TestCase):
+    def test_base64_with_line_breaks_is_accepted(self):
+        image = png_data_uri()
+        prefix, encoded = image.split(',', 1)
+        wrapped = prefix + ',' + '\n'.join(encoded[i:i + 76] for i in range(0, len(encoded), 76)) + '\n'
+        response = self.client.post('/api/recipes/', self.payload(wrapped), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.stored_files(), [Recipe.objects.get(pk=response.json()['id']).image.name])
+
+    def test_invalid_request_does_not_store_image(self):
+        response = self.client.post('/api/recipes/', self.payload(png_data_uri(), cooking_time=0), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_same_image_is_stored_once(self):
+        for name in ('первый', 'второй'):
+            response = self.client.post('/api/recipes/', self.payload(png_data_uri(), name=name), format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_invalid_base64_is_rejected(self):
+        response = self.client.post('/api/recipes/', self.payload('data:image/png;base64,abc*'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+
+
+class RecipeUpdateQueryTests(RecipeWriteMixin, TestCase):
+    def create(self, ingredient_count):
+        ingredients = [{'id': ingredient.pk, 'amount': 10} for ingredient in self.ingredients[:ingredient_count]]
+        response = self.client.post('/api/recipes/', self.payload(png_data_uri(), ingredients=ingredients),
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id'], ingredients
+
+    def patch(self, pk, ingredients, **fields):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api/recipes/{pk}/', {'ingredients': ingredients, **fields}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [query['sql'] for query in queries]
+
+    @staticmethod
+    def writes(queries, table):
+        return [sql for sql in queries if sql.split(' ', 1)[0] in ('INSERT', 'UPDATE', 'DELETE') and table in sql]
+
+    def test_title_edit_writes_only_the_recipe(self):
+        counts = []
+        for ingredient_count in (1, 4):
+            pk, ingredients = self.create(ingredient_count)
+            files = self.stored_files()
+            queries = self.patch(pk, ingredients, name='новое название', image=png_data_uri())
+            self.assertEqual(self.writes(queries, '"menu_recipeingredient"'), [])
+            self.assertEqual(len(self.writes(queries, '"menu_recipe"')), 1)
+            self.assertEqual(self.stored_files(), files)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_ingredient_changes_issue_one_statement_each(self):
+        pk, _ = self.create(3)
+        first, second, _, fourth = self.ingredients
+        queries = self.patch(pk, [{'id': first.pk, 'amount': 10}, {'id': second.pk, 'amount': 20},
+                                  {'id': fourth.pk, 'amount': 5}])
+        writes = [sql.split(' ', 1)[0] for sql in self.writes(queries, '"menu_recipeingredient"')]
+        self.assertEqual(sorted(writes), ['DELETE', 'INSERT', 'UPDATE'])
+        amounts = dict(RecipeIngredient.objects.filter(recipe_id=pk).values_list('ingredient_id', 'amount'))
+        self.assertEqual(amounts, {first.pk: 10, second.pk: 20, fourth.pk: 5})
+
+
+@override_settings(SHARED_CACHE=False)
+class ReplicaLagTests(TransactionTestCase):
+    """Реплика — отдельный файл SQLite, который обновляется только командой sync_replica.
+
+    Соединение регистрируется после setUpClass, поэтому тестовый раннер не создаёт для него базу.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        alias = settings.DATABASE_REPLICA_ALIAS
+        replica = {**connections.settings[DEFAULT_DB_ALIAS], 'NAME': str(Path(directory.name) / 'replica.sqlite3')}
+        connections.settings[alias] = replica
+        cls.databases = cls.databases | {alias}
+        cls.addClassCleanup(cls.remove_replica)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            cls.enterClassContext(override_settings(DATABASES={**settings.DATABASES, alias: replica}))
+
+    @staticmethod
+    def remove_replica():
+        alias = settings.DATABASE_REPLICA_ALIAS
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.ingredient = Ingredient.objects.create(name='соль', measurement_unit='г')
+        create_recipe(self.author, [self.ingredient])
+        self.sync_replica()
+        self.recipe = create_recipe(self.author, [self.ingredient], name='свежий')
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    @staticmethod
+    def sync_replica():
+        call_command('sync_replica', stdout=io.StringIO())
+
+    @staticmethod
+    def reads_replica(request):
+        routed = []
+        ReplicaRoutingMiddleware(lambda request: routed.append(read_from_replica.get()) or HttpResponse())(request)
+        return routed[0]
+
+    def test_reads_go_to_lagging_replica(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 404)
+        self.sync_replica()
+        self.assertEqual(APIClient().get(self.url).status_code, 200)
+
+    def test_writer_reads_own_changes_through_pin_cookie(self):
+        client = token_client(self.author)
+        response = client.post(f'{self.url}favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(settings.REPLICA_PIN_COOKIE_NAME, response.cookies)
+        self.assertTrue(client.get(self.url).json()['is_favorited'])
+        self.assertEqual(token_client(self.author).get(self.url).status_code, 404)
+
+    def test_pin_cookie_expires_after_lag(self):
+        client = token_client(self.author)
+        client.post(f'{self.url}favorite/')
+        with override_settings(REPLICA_LAG_SECONDS=0):
+            self.assertEqual(client.get(self.url).status_code, 404)
+
+    def test_forged_pin_cookie_is_ignored(self):
+        client = APIClient()
+        client.cookies[settings.REPLICA_PIN_COOKIE_NAME] = '1'
+        self.assertEqual(client.get(self.url).status_code, 404)
+
+    def test_credential_is_pinned_only_with_shared_cache(self):
+        factory = APIRequestFactory()
+        authorization = f'Token {Token.objects.create(user=self.author).key}'
+        for shared, expected in ((False, True), (True, False)):
+            with self.subTest(shared=shared), override_settings(SHARED_CACHE=shared):
+                self.assertFalse(self.reads_replica(factory.post('/api/recipes/', HTTP_AUTHORIZATION=authorization)))
+                self.assertEqual(self.reads_replica(factory.get('/api/recipes/', HTTP_AUTHORIZATION=authorization)),
+                                 expected)
+
+
+class ConcurrencyLimitTests(SimpleTestCase):
+    async def test_views_run_at_most_limit_at_once(self):
+        active = peak = 0
+
+        async def view(request):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return HttpResponse()
+
+        with override_settings(ASGI_CONCURRENCY_LIMIT=2):
+            middleware = ConcurrencyLimitMiddleware(view)
+        await asyncio.gather(*(middleware(APIRequestFactory().get('/')) for _ in range(6)))
+        self.assertEqual(peak, 2)
+
+    async def test_slow_client_does_not_hold_a_slot(self):
+        with override_settings(ASGI_CONCURRENCY_LIMIT=1):
+            application = ASGIHandler()
+        sending, release = asyncio.Event(), asyncio.Event()
+
+        async def request(send):
+            received = False
+
+            async def receive():
+                nonlocal received
+                if received:
+                    await asyncio.Event().wait()
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            scope = {'type': 'http', 'method': 'GET', 'path': '/missing/', 'query_string': b'', 'headers': [],
+                     'server': ('testserver', 80), 'scheme': 'http', 'asgi': {'version': '3.0'}}
+            await application(scope, receive, send)
+
+        async def slow_send(message):
+            sending.set()
+            await release.wait()
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        slow = asyncio.create_task(request(slow_send))
+        await asyncio.wait_for(sending.wait(), 5)
+        await asyncio.wait_for(request(send), 5)
+        self.assertEqual(messages[0]['status'], 404)
+        release.set()
+        await asyncio.wait_for(slow, 5)
+
+
+@override_settings(SHARED_CACHE=True)
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('reader')
+        self.client = token_client(self.user)
+        self.key = self.user.auth_token.key
+
+    def assert_authenticated(self, status_code=200):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, status_code)
+
+    def test_logout_revokes_cached_token(self):
+        self.assert_authenticated()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/auth/token/logout/').status_code, 204)
+        self.assert_authenticated(401)
+
+    def test_deactivation_revokes_cached_token(self):
+        self.assert_authenticated()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assert_authenticated(401)
+
+    def test_password_change_replaces_cached_user(self):
+        self.assert_authenticated()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': 'test-password-1', 'new_password': 'new-password-2'}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(token_cache.get(self.key).user.check_password('new-password-2'))
+
+    def test_cached_user_has_no_password_hash(self):
+        self.assert_authenticated()
+        entry = cache.get(token_cache._keys(self.key)[0])
+        self.assertIn('password', entry[1].user.get_deferred_fields())
+        self.assertNotIn(self.user.password.encode(), pickle.dumps(entry))
+        self.assertTrue(token_cache.get(self.key).user.check_password('test-password-1'))
+
+    def test_token_read_before_logout_is_not_cached_after_it(self):
+        stale = Token.objects.select_related('user').get(key=self.key)
+
+        def logout():
+            with self.captureOnCommitCallbacks(execute=True):
+                Token.objects.filter(key=self.key).delete()
+            return stale
+
+        with mock.patch.object(TokenCache, '_queryset') as queryset:
+            queryset.return_value.first.side_effect = logout
+            self.assertEqual(token_cache.get(self.key), stale)
+        self.assertIsNone(token_cache.get(self.key))
+        self.assert_authenticated(401)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_process_local_cache_is_not_used(self):
+        self.assert_authenticated()
+        Token.objects.filter(key=self.key).delete()
+        self.assert_authenticated(401)
+
+
+@override_settings(SHARED_CACHE=True)
+class RecipeRowSerializerTests(RecipeDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors[0].avatar = 'users/avatar.png'
+        cls.authors[0].save()
+        recipe = create_recipe(cls.authors[1], cls.ingredients, name='«кавычки» "и" \\ эмодзи 🍲', cooking_time=1)
+        recipe.text = 'строка\nтаб\t</script> \u2028\u2029 \x00'
+        recipe.save()
+
+    def render(self, user, action, serializer_class, renderer):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = user
+        view = RecipeViewSet(request=request, action=action, format_kwarg=None, kwargs={})
+        queryset = view.filter_queryset(view.get_queryset())
+        serializer = serializer_class(list(queryset), many=True, context=view.get_serializer_context())
+        return renderer.render(serializer.data)
+
+    def test_row_serializer_matches_drf_json(self):
+        for user, shared in itertools.product((AnonymousUser(), self.reader), (True, False)):
+            with self.subTest(user=user, shared=shared), override_settings(SHARED_CACHE=shared):
+                expected = self.render(user, 'retrieve', RecipeListSerializer, JSONRenderer())
+                actual = self.render(user, 'list', RecipeRowSerializer, ORJSONRenderer())
+                self.assertEqual(len(json.loads(expected)), len(self.recipes) + 1)
+                self.assertEqual(actual, expected)
+
+
+class IngredientSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('морская соль', 'Соль', 'сольца', 'сахар', 'фасоль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+
+    def names(self, query):
+        response = self.client.get('/api/ingredients/', {'name': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_prefix_matches_come_before_substring_matches(self):
+        self.assertEqual(self.names('сол'), ['Соль', 'сольца', 'морская соль', 'фасоль'])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_results_are_capped(self):
+        self.assertEqual(self.names('сол'), ['Соль', 'сольца'])
+        self.assertEqual(len(self.names('ль')), 2)
+
+    def test_saved_and_deleted_ingredients_update_index(self):
+        self.assertEqual(self.names('пе'), [])
+        ingredient = Ingredient.objects.create(name='перец', measurement_unit='г')
+        self.assertEqual(self.names('пе'), ['перец'])
+        ingredient.name = 'паприка'
+        ingredient.save()
+        self.assertEqual(self.names('пе'), [])
+        self.assertEqual(self.names('па'), ['паприка'])
+        ingredient.delete()
+        self.assertEqual(self.names('па'), [])
+
+    async def test_async_search_matches_sync_search(self):
+        self.assertEqual(await ingredient_index.asearch('сол'), await sync_to_async(ingredient_index.search)('сол'))
+
+
+class ShoppingListDownloadTests(RecipeDataMixin, TestCase):
+    totals = [('ингредиент 0', 'г', 4), ('ингредиент 1', 'г', 6), ('ингредиент 2', 'г', 6), ('ингредиент 3', 'г', 4)]
+
+    def download(self, user, file_format=None):
+        params = {'file_format': file_format} if file_format else {}
+        response = token_client(user).get('/api/recipes/download_shopping_cart/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'],
+                         f'attachment; filename="shopping_list.{file_format or "txt"}"')
+        return b''.join(response.streaming_content).decode()
+
+    def test_txt_sums_ingredient_across_recipes(self):
+        self.assertEqual(self.download(self.reader), 'Список покупок:\n\n' + ''.join(
+            f'{name} - {amount} {unit}\n' for name, unit, amount in self.totals))
+
+    def test_csv(self):
+        self.assertEqual(self.download(self.reader, 'csv'), 'name,measurement_unit,amount\r\n' + ''.join(
+            f'{name},{unit},{amount}\r\n' for name, unit, amount in self.totals))
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.download(self.reader, 'json')), [
+            {'name': name, 'measurement_unit': unit, 'amount': amount} for name, unit, amount in self.totals])
+        self.assertEqual(json.loads(self.download(self.authors[0], 'json')), [])
+
+    def test_same_name_with_other_unit_is_separate_line(self):
+        drops = Ingredient.objects.create(name='ингредиент 0', measurement_unit='шт')
+        ShoppingCartRelation.objects.create(user=self.reader, recipe=create_recipe(self.authors[0], [drops]))
+        self.assertIn('ингредиент 0 - 4 г\nингредиент 0 - 1 шт\n', self.download(self.reader))
+
+    def test_unknown_format_and_anonymous_are_rejected(self):
+        response = token_client(self.reader).get('/api/recipes/download_shopping_cart/', {'file_format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(APIClient().get('/api/recipes/download_shopping_cart/').status_code, 401)
+
+
+class ShortLinkTests(RecipeDataMixin, TestCase):
+    def link_path(self, recipe):
+        response = token_client(self.reader).get(f'/api/recipes/{recipe.pk}/get-link/')
+        self.assertEqual(response.status_code, 200)
+        return urlsplit(response.json()['short-link']).path
+
+    def test_link_is_stable_per_recipe(self):
+        recipe = self.recipes[0]
+        self.assertEqual(self.link_path(recipe), self.link_path(recipe))
+        self.assertEqual(ShortLink.objects.filter(recipe=recipe).count(), 1)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_redirect_is_served_from_cache_and_evicted_on_delete(self):
+        recipe = self.recipes[0]
+        path = self.link_path(recipe)
+        client = APIClient()
+        self.assertEqual(client.get(path)['Location'], f'/api/recipes/{recipe.pk}/')
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(path)['Location'], f'/api/recipes/{recipe.pk}/')
+        recipe.delete()
+        self.assertEqual(client.get(path).status_code, 404)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_process_local_cache_is_not_used(self):
+        recipe = self.recipes[0]
+        path = self.link_path(recipe)
+        self.assertEqual(APIClient().get(path)['Location'], f'/api/recipes/{recipe.pk}/')
+        self.assertIsNone(cache.get(ShortLink.cache_key(recipe.short_link.pk)))
+
+
+class CursorPaginationTests(RecipeDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Recipe.objects.filter(pk__in=[recipe.pk for recipe in cls.recipes[:8]]).update(
+            pub_date=cls.recipes[0].pub_date)
+
+    def get(self, url, client=None):
+        response = (client or APIClient()).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def walk(self, url, client=None):
+        pages = []
+        while url:
+            page = self.get(url, client)
+            pages.append(page)
+            url = page['next']
+        return pages
+
+    def ids(self, page):
+        return [recipe['id'] for recipe in page['results']]
+
+    def test_walk_is_stable_across_equal_pub_dates(self):
+        pages = self.walk('/api/recipes/?cursor=&limit=5')
+        self.assertEqual([len(page['results']) for page in pages], [5, 5, 2])
+        expected = list(Recipe.objects.order_by('-pub_date', '-id').values_list('pk', flat=True))
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], expected)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_returns_earlier_page(self):
+        pages = self.walk('/api/recipes/?cursor=&limit=5')
+        for index in (1, 2):
+            previous = self.get(pages[index]['previous'])
+            self.assertEqual(self.ids(previous), self.ids(pages[index - 1]))
+            self.assertEqual(self.ids(self.get(previous['next'])), self.ids(pages[index]))
+        self.assertIsNone(self.get(pages[1]['previous'])['previous'])
+
+    def test_filters_are_kept_with_cursor(self):
+        author = self.authors[0]
+        pages = self.walk(f'/api/recipes/?author={author.pk}&cursor=&limit=1')
+        expected = list(author.recipes.order_by('-pub_date', '-id').values_list('pk', flat=True))
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], expected)
+        client = token_client(self.reader)
+        favorites = [pk for page in self.walk('/api/recipes/?is_favorited=1&cursor=&limit=2', client)
+                     for pk in self.ids(page)]
+        self.assertEqual(sorted(favorites), sorted(recipe.pk for recipe in self.recipes[::2]))
+
+    def test_malformed_cursor_is_not_found(self):
+        position = base64.urlsafe_b64encode(b'2024-01-01T00:00:00|1|x').decode()
+        for cursor in ('!!!', 'YWJj', position):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(APIClient().get(f'/api/recipes/?cursor={cursor}').status_code, 404)
+
+
+class QueryPlanTests(RecipeDataMixin, TestCase):
+    def test_hot_paths_do_not_scan_large_tables(self):
+        recipe = self.recipes[0]
+        ShortLink.objects.create(recipe=recipe)
+        urls = hot_urls(self.reader, recipe, self.ingredients[0])
+        for shared in (False, True):
+            with self.subTest(shared=shared), override_settings(SHARED_CACHE=shared):
+                cache.clear()
+                recipe_ingredient_index.match([], 1)
+                plans = collect_plans(self.reader, urls)
+                self.assertGreater(len(plans), len(urls))
+                violations = {sql: full_scans(sql, plan) for url, sql, plan in plans if full_scans(sql, plan)}
+                self.assertEqual(violations, {})
+
+    def test_full_scan_is_detected(self):
+        sql = 'SELECT COUNT(*) FROM "menu_recipe" WHERE "menu_recipe"."text" = %s'
+        self.assertEqual(full_scans(sql, explain(sql, ['описание'])), ['SCAN menu_recipe'])
+
+
+class RecipeSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredient = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.author = create_user('author')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = APIClient().get('/api/recipes/', {'search': query, 'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    @staticmethod
+    def indexed(pk):
+        return RecipeSearchDocument.objects.filter(recipe_id=pk).values_list('name', 'text').first()
+
+    def test_recipe_is_indexed_on_insert(self):
+        recipe = create_recipe(self.author, [self.ingredient], name='Картошка с грибами', text='Обжарить лук')
+        self.assertEqual(self.indexed(recipe.pk),
+                         (' '.join(stem_words(recipe.name)), ' '.join(stem_words(recipe.text))))
+        self.assertEqual(self.search('картошка'), [recipe.pk])
+        self.assertEqual(self.search('лук'), [recipe.pk])
+
+    def test_index_follows_update(self):
+        recipe = create_recipe(self.author, [self.ingredient], name='Картошка с грибами')
+        recipe.name = 'Гречка с луком'
+        recipe.save()
+        self.assertEqual(self.indexed(recipe.pk)[0], ' '.join(stem_words('Гречка с луком')))
+        self.assertEqual(self.search('картошка'), [])
+        self.assertEqual(self.search('гречка'), [recipe.pk])
+
+    def test_index_row_is_removed_on_delete(self):
+        recipe = create_recipe(self.author, [self.ingredient], name='Картошка с грибами')
+        pk = recipe.pk
+        recipe.delete()
+        self.assertIsNone(self.indexed(pk))
+        self.assertEqual(self.search('картошка'), [])
+
+    def test_word_forms_match(self):
+        self.assertEqual(stem('картошка'), stem('картошки'))
+        recipe = create_recipe(self.author, [self.ingredient], name='Картошка по-деревенски')
+        for query in ('картошка', 'картошки', 'картошкой', 'КАРТОШКУ'):
+            self.assertEqual(self.search(query), [recipe.pk], query)
+
+    def test_all_query_words_must_match(self):
+        soup = create_recipe(self.author, [self.ingredient], name='Суп грибной')
+        create_recipe(self.author, [self.ingredient], name='Суп овощной')
+        self.assertEqual(self.search('грибной суп'), [soup.pk])
+
+    def test_name_match_ranks_above_text_match(self):
+        in_name = create_recipe(self.author, [self.ingredient], name='Грибы жареные', text='Обжарить на масле')
+        in_text = create_recipe(self.author, [self.ingredient], name='Суп овощной', text='Добавить грибы')
+        self.assertEqual(self.search('грибы'), [in_name.pk, in_text.pk])
+        self.assertEqual(self.search('суп'), [in_text.pk])
+
+
+class FromIngredientsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = [Ingredient.objects.create(name=f'ингредиент {i}', measurement_unit='г') for i in range(4)]
+        first, second, third, fourth = cls.ingredients
+        cls.author = create_user('author')
+        cls.third_of = create_recipe(cls.author, [first, third, fourth], name='треть')
+        cls.half_of = create_recipe(cls.author, [first, third], name='половина')
+        cls.all_of = create_recipe(cls.author, [first, second], name='все')
+        cls.two_thirds_of = create_recipe(cls.author, [first, second, third], name='две трети')
+        cls.unrelated = create_recipe(cls.author, [third, fourth], name='без совпадений')
+
+    def setUp(self):
+        recipe_ingredient_index.invalidate()
+        self.addCleanup(recipe_ingredient_index.invalidate)
+
+    def from_ingredients(self, *ingredients, **params):
+        ids = ','.join(str(getattr(ingredient, 'pk', ingredient)) for ingredient in ingredients)
+        response = APIClient().get('/api/recipes/from_ingredients/', {'ingredients': ids, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(recipe['id'], recipe['matched_ingredients'], recipe['total_ingredients'])
+                for recipe in response.json()['results']]
+
+    def test_recipes_are_ordered_by_share_of_found_ingredients(self):
+        first, second = self.ingredients[:2]
+        self.assertEqual(self.from_ingredients(first, second), [
+            (self.all_of.pk, 2, 2), (self.two_thirds_of.pk, 2, 3), (self.half_of.pk, 1, 2), (self.third_of.pk, 1, 3),
+        ])
+        self.assertEqual(self.from_ingredients(first, second, first), self.from_ingredients(first, second))
+
+    def test_equal_share_puts_newer_recipe_first(self):
+        newer = create_recipe(self.author, self.ingredients[:2], name='все, новее')
+        self.assertEqual([pk for pk, _, _ in self.from_ingredients(*self.ingredients[:2])][:2],
+                         [newer.pk, self.all_of.pk])
+
+    def test_limit(self):
+        first, second = self.ingredients[:2]
+        self.assertEqual(self.from_ingredients(first, second, limit=2),
+                         [(self.all_of.pk, 2, 2), (self.two_thirds_of.pk, 2, 3)])
+
+    def test_unknown_ids_are_ignored(self):
+        first, second = self.ingredients[:2]
+        unknown = Ingredient.objects.order_by('-pk').first().pk + 1
+        self.assertEqual(self.from_ingredients(first, second, unknown), self.from_ingredients(first, second))
+        self.assertEqual(self.from_ingredients(unknown), [])
+
+    def test_invalid_ids_are_rejected(self):
+        for value in ('', 'один', '1,,x'):
+            response = APIClient().get('/api/recipes/from_ingredients/', {'ingredients': value})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_index_follows_recipe_edit(self):
+        first, second, third, fourth = self.ingredients
+        self.from_ingredients(first)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = token_client(self.author).patch(f'/api/recipes/{self.unrelated.pk}/', {
+                'ingredients': [{'id': first.pk, 'amount': 1}, {'id': second.pk, 'amount': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn((self.unrelated.pk, 2, 2), self.from_ingredients(first, second))
+        self.assertNotIn(self.unrelated.pk, [pk for pk, _, _ in self.from_ingredients(fourth)])
+
+    def test_index_follows_recipe_delete(self):
+        first = self.ingredients[0]
+        self.from_ingredients(first)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = token_client(self.author).delete(f'/api/recipes/{self.all_of.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn(self.all_of.pk, [pk for pk, _, _ in recipe_ingredient_index.match([first.pk], 10)])
+        self.assertEqual(len(self.from_ingredients(first)), 3)
+
+
+class RecipeBatchTests(RecipeDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = token_client(self.reader)
+        self.missing = Recipe.objects.order_by('-pk').first().pk + 1
+
+    def change(self, method, kind, recipes):
+        response = getattr(self.client, method)(f'/api/recipes/{kind}/', {'recipes': recipes}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(result['id'], result['status']) for result in response.json()['results']]
+
+    def test_add_reports_status_per_id(self):
+        favorite, other = self.recipes[0], self.recipes[1]
+        results = self.change('post', 'favorite', [favorite.pk, other.pk, self.missing, other.pk])
+        self.assertEqual(results, [(favorite.pk, 'already_added'), (other.pk, 'added'), (self.missing, 'not_found')])
+        self.assertTrue(FavoriteRelation.objects.filter(user=self.reader, recipe=other).exists())
+        self.assertEqual(Recipe.objects.get(pk=other.pk).favorites_count, 1)
+        self.assertEqual(Recipe.objects.get(pk=favorite.pk).favorites_count, 1)
+
+    def test_remove_reports_status_per_id(self):
+        in_cart, other = self.recipes[0], self.recipes[1]
+        with CaptureQueriesContext(connection) as queries:
+            results = self.change('delete', 'shopping_cart', [self.missing, in_cart.pk, other.pk, in_cart.pk])
+        self.assertEqual(results, [(self.missing, 'not_found'), (in_cart.pk, 'removed'), (other.pk, 'not_added')])
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('DELETE')]), 1)
+        self.assertFalse(ShoppingCartRelation.objects.filter(user=self.reader, recipe=in_cart).exists())
+        self.assertEqual(Recipe.objects.get(pk=in_cart.pk).in_carts_count, 0)
+        self.assertEqual(ShoppingCartRelation.objects.filter(user=self.reader).count(), len(self.recipes[::3]) - 1)
+
+    def test_only_missing_ids_change_nothing(self):
+        self.assertEqual(self.change('delete', 'favorite', [self.missing]), [(self.missing, 'not_found')])
+        self.assertEqual(FavoriteRelation.objects.filter(user=self.reader).count(), len(self.recipes[::2]))
+
+    def test_invalid_requests_are_rejected(self):
+        for recipes in ([], [0], ['один'], list(range(1, 102))):
+            response = self.client.post('/api/recipes/favorite/', {'recipes': recipes}, format='json')
+            self.assertEqual(response.status_code, 400, recipes)
+        response = APIClient().post('/api/recipes/favorite/', {'recipes': [self.recipes[0].pk]}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class GenerateFakeDataTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    @staticmethod
+    def generate(**options):
+        call_command('generate_fake_data', users=5, recipes=20, ingredients=10, ingredients_per_recipe=2,
+                     favorites=2, shopping_cart=1, subscriptions=1, seed=3, stdout=io.StringIO(), **options)
+        recipes = list(Recipe.objects.order_by('pub_date', 'id').values_list(
+            'author__username', 'name', 'text', 'cooking_time', 'pub_date', 'updated_at'))
+        User.objects.filter(username__startswith='fake3-').delete()
+        Ingredient.objects.filter(name__startswith='fake3-').delete()
+        return recipes
+
+    def test_same_seed_gives_same_recipes(self):
+        first = self.generate()
+        self.assertEqual(self.generate(), first)
+        self.assertEqual(first[-1][4].isoformat(), '2025-01-01T00:00:00+00:00')
+
+    def test_base_date_option(self):
+        recipes = self.generate(base_date='2020-05-01T12:00')
+        self.assertEqual([recipe[4].isoformat() for recipe in recipes[-2:]],
+                         ['2020-05-01T11:53:00+00:00', '2020-05-01T12:00:00+00:00'])
+        with self.assertRaises(CommandError):
+            self.generate(base_date='вчера')
+
+
+class SQLInstrumentationTests(TestCase):
+    @override_settings(SQL_SLOW_REQUEST_MS=0)
+    def test_slow_request_is_logged(self):
+        with self.assertLogs('menu.sql', 'WARNING') as logs:
+            response = APIClient().get('/api/ingredients/')
+        self.assertIn('Server-Timing', response)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['event'], record['path'], record['status']),
+                         ('slow_request', '/api/ingredients/', 200))
+
+    def test_fast_request_is_not_logged(self):
+        with self.assertNoLogs('menu.sql', 'WARNING'):
+            APIClient().get('/api/ingredients/')
+
+
+class AsyncRecipeViewTests(RecipeDataMixin, TestCase):
+    list_view = staticmethod(async_read_view(RecipeViewSet, 'alist', {'get': 'list'},
+                                             basename='recipes', detail=False))
+    detail_view = staticmethod(async_read_view(RecipeViewSet, 'aretrieve', {'get': 'retrieve'},
+                                               basename='recipes', detail=True))
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.get_or_create(user=self.reader)[0].key
+
+    def get(self, view, path, **kwargs):
+        request = AsyncRequestFactory().get(path, headers={'Authorization': f'Token {self.token}'})
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(view)(request, **kwargs)
+        return response, [query['sql'] for query in queries]
+
+    def test_list_skips_validators_without_shared_cache(self):
+        for path in ('/api/recipes/?limit=5&page=2', '/api/recipes/?cursor=&limit=5'):
+            response, queries = self.get(self.list_view, path)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('ETag', response)
+            self.assertFalse([sql for sql in queries if 'MAX(' in sql], path)
+            self.assertEqual(json.loads(response.content), token_client(self.reader).get(path).json())
+
+    def test_detail_skips_validators_without_shared_cache(self):
+        recipe = self.recipes[0]
+        path = f'/api/recipes/{recipe.pk}/'
+        response, queries = self.get(self.detail_view, path, pk=recipe.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertFalse([sql for sql in queries if sql.startswith('SELECT "menu_recipe"."updated_at"')])
+        self.assertEqual(json.loads(response.content), token_client(self.reader).get(path).json())
+        missing = Recipe.objects.order_by('-pk').first().pk + 1
+        self.assertEqual(self.get(self.detail_view, f'/api/recipes/{missing}/', pk=missing)[0].status_code, 404)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_validators_are_sent_with_shared_cache(self):
+        recipe = self.recipes[0]
+        for view, path, kwargs in ((self.list_view, '/api/recipes/', {}),
+                                   (self.detail_view, f'/api/recipes/{recipe.pk}/', {'pk': recipe.pk})):
+            response = self.get(view, path, **kwargs)[0]
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('ETag', response)
+
+
+class LoadIngredientsTests(TestCase):
+    def load(self, content, suffix):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / f'ingredients.{suffix}'
+            path.write_text(content, encoding='utf-8')
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('load_ingredients', str(path), batch_size=2, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_malformed_jsonl_line_is_skipped_with_its_number(self):
+        content = ('{"name": "соль", "measurement_unit": "г"}\n'
+                   '{"name": "сахар", "measurement_unit": \n'
+                   '\n'
+                   '[1, 2]\n'
+                   '{"name": "мука", "measurement_unit": "г"}\n')
+        stdout, stderr = self.load(content, 'jsonl')
+        self.assertIn('Строка 2', stderr)
+        self.assertIn('пропущено: 2', stdout)
+        self.assertEqual(set(Ingredient.objects.values_list('name', flat=True)), {'соль', 'мука'})
+
+    def test_reload_does_not_duplicate(self):
+        content = 'соль,г\nсахар,г\nсоль,г\nбез единицы\n'
+        self.load(content, 'csv')
+        stdout, _ = self.load(content, 'csv')
+        self.assertIn('добавлено: 0', stdout)
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_malformed_json_document_raises_command_error(self):
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.load('[{"name": "соль", "measurement_unit": "г"},\n{"name"]', 'json')
+        self.assertFalse(Ingredient.objects.exists())
@@ -0,0 +1,37 @@
+import time
+import uuid
+
+from django.core.cache import cache
+
+from menu.db_router import avoid_stale_replica
+
+RECIPES = 'recipes'
+INGREDIENTS = 'ingredients'
+
+
+def relations(user_id):
+    return f'relations:{user_id}'
+
+
+def get_version(name):
+    """Возвращает пару (токен, время изменения) для именованной версии данных.
+
+    Токен случайный, поэтому вытеснение из кэша не приводит к совпадению со старым значением.
+    Версии согласованы между процессами только в общем кэше (SHARED_CACHE).
+    Недавнее изменение переводит чтения текущего запроса с реплики на основную базу.
+    """
+    key = f'version:{name}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key) or _new_version()
+    avoid_stale_replica(version[1])
+    return version
+
+
+def bump_version(name):
+    cache.set(f'version:{name}', _new_version(), timeout=None)
+
+
+def _new_version():
+    return uuid.uuid4().hex, time.time()
@@ -1,17 +1,41 @@
+from base64 import b64decode, b64encode
+from datetime import datetime
+from functools import partial
 from http import HTTPStatus
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import InvalidPage
+from django.db import transaction
+from django.db.models import BooleanField, Count, Exists, Max, OuterRef, Prefetch, Q, Sum, Value
+from django.http import StreamingHttpResponse
 from django.urls import reverse
 from rest_framework import generics
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.shortcuts import redirect
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.utils.urls import replace_query_param
 
+from menu import versions
+from menu.bulk import delete_by_pk
+from menu.conditional import aconditional_get, conditional_get
+from menu.counters import refresh_recipe_counter
+from menu.ingredient_index import ingredient_index
 from menu.models import ShortLink
+from menu.recipe_ingredient_index import recipe_ingredient_index
+from menu.recipe_sets import FAVORITES, RELATION_MODELS, SHOPPING_CART, recipe_sets
+from menu.renderers import ORJSONRenderer
+from menu.response_cache import recipe_response_cache
+from menu.search import get_search_backend
+from menu.shopping_list import RENDERERS
 from menu.serializers import *
+from my_user.models import SubscriptionRelation
 from django_filters import FilterSet, CharFilter, NumberFilter
 
 
@@ -20,11 +44,113 @@ class RecipePagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 100
 
+    async def apaginate_queryset(self, queryset, request, count):
+        """Асинхронный paginate_queryset; count — уже известное число объектов."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = count
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [item async for item in self.page.object_list]
+        return self.page.object_list
+
+
+class RecipeCursorPagination(BasePagination):
+    """Постраничный вывод по ключу (pub_date, id) без COUNT(*) и OFFSET.
+
+    Включается параметром ?cursor= (пустое значение — первая страница). Курсор ссылки previous
+    помечен как обратный: окно выбирается по возрастанию ключа и разворачивается.
+    """
+    cursor_query_param = 'cursor'
+    page_size = RecipePagination.page_size
+    page_size_query_param = RecipePagination.page_size_query_param
+    max_page_size = RecipePagination.max_page_size
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        return self.set_page(list(self.get_window(queryset, request, page_size)), page_size)
+
+    async def apaginate_queryset(self, queryset, request, count=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        window = self.get_window(queryset, request, page_size)
+        return self.set_page([item async for item in window], page_size)
+
+    def get_window(self, queryset, request, page_size):
+        position = self.decode_cursor(request)
+        if position is None:
+            return queryset.order_by('-pub_date', '-id')[:page_size + 1]
+        pub_date, pk, reverse = position
+        if reverse:
+            queryset = queryset.order_by('pub_date', 'id').filter(
+                Q(pub_date__gt=pub_date) | Q(id__gt=pk), pub_date__gte=pub_date)
+        else:
+            queryset = queryset.order_by('-pub_date', '-id').filter(
+                Q(pub_date__lt=pub_date) | Q(id__lt=pk), pub_date__lte=pub_date)
+        return queryset[:page_size + 1]
+
+    def set_page(self, page, page_size):
+        position = self.decode_cursor(self.request)
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if position is not None and position[2]:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.first, self.last = (page[0], page[-1]) if page else (None, None)
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, pk, *direction = b64decode(encoded.encode(), altchars=b'-_', validate=True).decode().split('|')
+            if direction not in ([], ['r']):
+                raise ValueError(encoded)
+            return datetime.fromisoformat(pub_date), int(pk), bool(direction)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe, reverse=False):
+        position = f'{recipe.pub_date.isoformat()}|{recipe.pk}' + ('|r' if reverse else '')
+        return b64encode(position.encode(), altchars=b'-_').decode()
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.first, reverse=True))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data})
+
 
 class RecipeFilter(FilterSet):
     author = NumberFilter(field_name='author__id')
     is_in_shopping_cart = NumberFilter(method='filter_is_in_shopping_cart')
     is_favorited = NumberFilter(method='filter_is_favorited')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
@@ -42,6 +168,9 @@ class RecipeFilter(FilterSet):
             return queryset.filter(favorites__user=user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        return get_search_backend().search(queryset, value)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
@@ -49,18 +178,177 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = RecipePagination
     permission_classes = [IsAuthenticatedOrReadOnly]
     filterset_class = RecipeFilter
+    renderer_classes = [ORJSONRenderer, BrowsableAPIRenderer]
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator')
+                and RecipeCursorPagination.cursor_query_param in self.request.query_params):
+            self._paginator = RecipeCursorPagination()
+        return super().paginator
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return Recipe.objects.all()
+        user = self.request.user
+        authors = User.objects.all()
+        queryset = Recipe.objects.prefetch_related(
+            Prefetch('recipe_ingredients', queryset=RecipeIngredient.objects.select_related('ingredient'))
+        )
+        if user.is_authenticated:
+            authors = authors.annotate(
+                is_subscribed=Exists(SubscriptionRelation.objects.filter(sender=user, to=OuterRef('pk')))
+            )
+            if not settings.SHARED_CACHE:
+                queryset = queryset.annotate(
+                    is_favorited=Exists(FavoriteRelation.objects.filter(user=user, recipe=OuterRef('pk'))),
+                    is_in_shopping_cart=Exists(ShoppingCartRelation.objects.filter(user=user, recipe=OuterRef('pk')))
+                )
+        else:
+            authors = authors.annotate(is_subscribed=Value(False, output_field=BooleanField()))
+            queryset = queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return queryset.prefetch_related(Prefetch('author', queryset=authors))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            return queryset.values_list(*RecipeRowSerializer.fields, named=True)
+        return queryset
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
+        user = self.request.user
+        if settings.SHARED_CACHE and user.is_authenticated and self.action in ('list', 'retrieve'):
+            context['favorited_ids'] = recipe_sets.get(user.pk, FAVORITES)
+            context['shopping_cart_ids'] = recipe_sets.get(user.pk, SHOPPING_CART)
+        return context
+
+    async def aget_serializer_context(self):
+        context = super().get_serializer_context()
+        user = self.request.user
+        if settings.SHARED_CACHE and user.is_authenticated:
+            context['favorited_ids'] = await recipe_sets.aget(user.pk, FAVORITES)
+            context['shopping_cart_ids'] = await recipe_sets.aget(user.pk, SHOPPING_CART)
         return context
 
+    def list(self, request, *args, **kwargs):
+        render = self.get_renderer(super().list, request, *args, **kwargs)
+        if not settings.SHARED_CACHE:
+            return render()
+        return conditional_get(request, *self.get_list_validators(), render)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_object_validators(kwargs[self.lookup_field]) if settings.SHARED_CACHE else None
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        return conditional_get(request, *validators,
+                               self.get_renderer(super().retrieve, request, *args, **kwargs))
+
+    async def alist(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        stats = {}
+        if settings.SHARED_CACHE:
+            stats_queryset, aggregates = self.get_list_aggregates(queryset)
+            stats = await stats_queryset.aaggregate(**aggregates)
+
+        async def render():
+            count = stats.get('count')
+            if count is None and isinstance(self.paginator, RecipePagination):
+                count = await queryset.acount()
+            page = await self.paginator.apaginate_queryset(queryset, request, count)
+            serializer = self.get_serializer_class()(page, many=True, context=await self.aget_serializer_context())
+            return self.paginator.get_paginated_response(await serializer.adata())
+
+        render = self.get_async_renderer(render, request)
+        if not settings.SHARED_CACHE:
+            return await render()
+        return await aconditional_get(request, *self.list_validators(stats), render)
+
+    async def aretrieve(self, request, pk):
+        async def render():
+            try:
+                instance = await self.filter_queryset(self.get_queryset()).aget(pk=pk)
+            except Recipe.DoesNotExist:
+                raise NotFound()
+            return Response(self.get_serializer_class()(instance, context=await self.aget_serializer_context()).data)
+
+        render = self.get_async_renderer(render, request)
+        if not settings.SHARED_CACHE:
+            return await render()
+        validators = self.object_validators(
+            await Recipe.objects.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+        )
+        if validators is None:
+            raise NotFound()
+        return await aconditional_get(request, *validators, render)
+
+    def get_renderer(self, view, request, *args, **kwargs):
+        render = partial(view, request, *args, **kwargs)
+        if request.user.is_authenticated:
+            return render
+        return partial(recipe_response_cache.get_or_render, request, render)
+
+    def get_async_renderer(self, render, request):
+        if request.user.is_authenticated:
+            return render
+        return partial(recipe_response_cache.aget_or_render, request, render)
+
+    def get_list_validators(self):
+        stats_queryset, aggregates = self.get_list_aggregates(self.filter_queryset(self.get_queryset()))
+        return self.list_validators(stats_queryset.aggregate(**aggregates))
+
+    def get_list_aggregates(self, queryset):
+        """Запрос и агрегаты для валидаторов списка.
+
+        В режиме курсора агрегируется только окно текущей страницы, без COUNT:
+        добавление и удаление рецептов и так меняют версию рецептов.
+        """
+        if isinstance(self.paginator, RecipeCursorPagination):
+            page_size = self.paginator.get_page_size(self.request)
+            window = self.paginator.get_window(queryset.values('updated_at'), self.request, page_size)
+            return window, {'last_modified': Max('updated_at')}
+        return queryset.order_by(), {'last_modified': Max('updated_at'), 'count': Count('id')}
+
+    def list_validators(self, stats):
+        data_versions = self.get_versions()
+        last_modified = max([changed_at for _, changed_at in data_versions]
+                            + ([stats['last_modified'].timestamp()] if stats['last_modified'] else []))
+        return (stats['last_modified'], stats.get('count'), data_versions), last_modified
+
+    def get_object_validators(self, pk):
+        try:
+            updated_at = Recipe.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+        return self.object_validators(updated_at)
+
+    def object_validators(self, updated_at):
+        if updated_at is None:
+            return None
+        data_versions = self.get_versions()
+        last_modified = max([updated_at.timestamp()] + [changed_at for _, changed_at in data_versions])
+        return (updated_at, data_versions), last_modified
+
+    def get_versions(self):
+        data_versions = (versions.get_version(versions.RECIPES), versions.get_version(versions.INGREDIENTS))
+        user = self.request.user
+        if user.is_authenticated:
+            return data_versions + (versions.get_version(versions.relations(user.pk)),)
+        return data_versions
+
     def get_serializer_class(self):
-        if self.action.lower() == 'get':
+        if self.action == 'list':
+            return RecipeRowSerializer
+        if self.action == 'retrieve':
             return RecipeListSerializer
         else:
             return RecipeCreateUpdateSerializer
 
+    @transaction.atomic
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.author != request.user:
@@ -69,12 +357,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=HTTPStatus.NO_CONTENT)
 
     @action(detail=True, methods=['get'], url_path='get-link')
-    def get_link(self, _, pk=None):
-        inst = ShortLink(recipe_id=pk)
-        inst.save()
-        return Response({'short-link': reverse('short-link', kwargs={'pk': inst.id})})
+    def get_link(self, request, pk=None):
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        link, _ = ShortLink.objects.get_or_create(recipe=recipe)
+        return Response({'short-link': request.build_absolute_uri(reverse('short-link', kwargs={'pk': link.id}))})
 
     @action(detail=True, methods=['post', 'delete'], url_path='favorite')
+    @transaction.atomic
     def favorite(self, request, pk=None):
         try:
             recipe = Recipe.objects.get(pk=pk)
@@ -94,6 +383,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(status=HTTPStatus.NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], url_path='shopping_cart')
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
         try:
             recipe = Recipe.objects.get(pk=pk)
@@ -111,31 +401,103 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 return Response(status=HTTPStatus.BAD_REQUEST)
             return Response(status=HTTPStatus.NO_CONTENT)
 
-    @action(detail=False, methods=['get'], url_path='download_shopping_cart')
-    def download_shopping_cart(self, request):
-        ingredients = request.user.shopping_cart.all().values_list(
-            'recipe__recipe_ingredients__ingredient__name',
-            'recipe__recipe_ingredients__ingredient__measurement_unit',
-            'recipe__recipe_ingredients__amount'
-        )
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
+            permission_classes=[IsAuthenticated])
+    @transaction.atomic
+    def favorite_batch(self, request):
+        return self.change_recipe_set(request, FAVORITES, 'favorites_count')
+
+    @action(detail=False, methods=['post', 'delete'], url_path='shopping_cart',
+            permission_classes=[IsAuthenticated])
+    @transaction.atomic
+    def shopping_cart_batch(self, request):
+        return self.change_recipe_set(request, SHOPPING_CART, 'in_carts_count')
 
-        shopping_list = {}
-        for name, unit, amount in ingredients:
-            if name not in shopping_list:
-                shopping_list[name] = {'amount': 0, 'unit': unit}
-            shopping_list[name]['amount'] += amount
+    def change_recipe_set(self, request, kind, counter_field):
+        """Добавляет или удаляет несколько рецептов в избранном или корзине одним запросом.
 
-        text_content = "Список покупок:\n\n"
-        for name, data in shopping_list.items():
-            text_content += f"{name} - {data['amount']} {data['unit']}\n"
+        Сигналы моделей связей при этом не срабатывают, поэтому счётчики рецептов
+        и версия связей пользователя, от которой зависит кэш множеств, обновляются здесь.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        model = RELATION_MODELS[kind]
+        user = request.user
+        existing = set(Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True))
+        present = dict(model.objects.filter(user=user, recipe_id__in=existing).values_list('recipe_id', 'pk'))
+        if request.method == 'POST':
+            changed = existing - present.keys()
+            model.objects.bulk_create([model(user=user, recipe_id=pk) for pk in changed], ignore_conflicts=True)
+            statuses = {pk: 'added' if pk in changed else 'already_added' for pk in existing}
+        else:
+            changed = set(present)
+            delete_by_pk(model, present.values())
+            statuses = {pk: 'removed' if pk in changed else 'not_added' for pk in existing}
+        if changed:
+            refresh_recipe_counter(changed, model, counter_field)
+            transaction.on_commit(lambda: versions.bump_version(versions.relations(user.pk)))
+        return Response({'results': [{'id': pk, 'status': statuses.get(pk, 'not_found')} for pk in recipe_ids]})
+
+    @action(detail=False, methods=['get'], url_path='from_ingredients')
+    def from_ingredients(self, request):
+        try:
+            ingredient_ids = [int(pk) for pk in request.query_params.get('ingredients', '').split(',') if pk]
+        except ValueError:
+            return Response({'ingredients': 'Ожидается список id ингредиентов через запятую'},
+                            status=HTTPStatus.BAD_REQUEST)
+        if not ingredient_ids:
+            return Response({'ingredients': 'Укажите хотя бы один ингредиент'}, status=HTTPStatus.BAD_REQUEST)
+        limit = RecipeCursorPagination().get_page_size(request)
+        matches = recipe_ingredient_index.match(ingredient_ids, limit)
+        recipes = Recipe.objects.only('id', 'name', 'image', 'cooking_time').in_bulk([pk for pk, _, _ in matches])
+        results = []
+        for pk, matched, total in matches:
+            recipe = recipes.get(pk)
+            if recipe is not None:
+                recipe.matched_ingredients, recipe.total_ingredients = matched, total
+                results.append(recipe)
+        return Response({'results': RecipeMatchSerializer(results, many=True, context={'request': request}).data})
+
+    @action(detail=False, methods=['get'], url_path='download_shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def download_shopping_cart(self, request):
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in RENDERERS:
+            return Response({'file_format': f'Доступные форматы: {", ".join(RENDERERS)}'},
+                            status=HTTPStatus.BAD_REQUEST)
+        content_type, render = RENDERERS[file_format]
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_cart_recipe__user=request.user
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
 
-        response = Response(text_content, content_type='text/plain', status=HTTPStatus.OK)
-        response['Content-Disposition'] = 'attachment; filename="shopping_list.txt"'
+        response = StreamingHttpResponse(render(ingredients.iterator()), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="shopping_list.{file_format}"'
         return response
 
 
 def view_short_link(request, pk):
-    return redirect('recipes-detail', pk=ShortLink.objects.get(recipe_id=pk).id)
+    cache_key = ShortLink.cache_key(pk)
+    recipe_id = cache.get(cache_key) if settings.SHARED_CACHE else None
+    if recipe_id is None:
+        recipe_id = get_object_or_404(ShortLink.objects.only('recipe_id'), pk=pk).recipe_id
+        if settings.SHARED_CACHE:
+            cache.set(cache_key, recipe_id, timeout=None)
+    return redirect('recipes-detail', pk=recipe_id)
+
+
+async def aview_short_link(request, pk):
+    cache_key = ShortLink.cache_key(pk)
+    recipe_id = await cache.aget(cache_key) if settings.SHARED_CACHE else None
+    if recipe_id is None:
+        recipe_id = (await aget_object_or_404(ShortLink.objects.only('recipe_id'), pk=pk)).recipe_id
+        if settings.SHARED_CACHE:
+            await cache.aset(cache_key, recipe_id, timeout=None)
+    return redirect('recipes-detail', pk=recipe_id)
 
 
 class IngredientFilter(FilterSet):
@@ -152,7 +514,30 @@ class IngredientListAPIView(generics.ListAPIView):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            render = partial(Response, ingredient_index.search(name))
+        else:
+            render = partial(super().list, request, *args, **kwargs)
+        return conditional_get(request, versions.get_version(versions.INGREDIENTS), None, render)
+
+    async def alist(self, request):
+        name = request.query_params.get('name')
+
+        async def render():
+            if name:
+                return Response(await ingredient_index.asearch(name))
+            queryset = self.filter_queryset(self.get_queryset())
+            return Response(self.get_serializer([item async for item in queryset.aiterator()], many=True).data)
+
+        return await aconditional_get(request, versions.get_version(versions.INGREDIENTS), None, render)
+
 
 class IngredientDetailAPIView(generics.RetrieveAPIView):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_get(request, versions.get_version(versions.INGREDIENTS), None,
+                               partial(super().retrieve, request, *args, **kwargs))
@@ -0,0 +1,94 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from menu.cache_stats import CacheStats
+
+
+class TokenCache:
+    """Токены вместе со снимком пользователя в кэше Django на TOKEN_CACHE_TIMEOUT секунд.
+
+    recipes_count отложен: счётчик меняется через F()-выражения без сигналов,
+    поэтому читается из базы при обращении и не перезаписывается при save().
+    password тоже отложен, чтобы хеш пароля не попадал в кэш; он читается из базы
+    только при проверке или смене пароля.
+
+    Запись хранится вместе с поколением токена, а invalidate() меняет поколение: снимок,
+    прочитанный из базы до выхода или изменения пользователя и записанный уже после
+    инвалидации, не принимается. Без общего кэша (SHARED_CACHE) токены читаются из базы.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats('tokens')
+
+    def get(self, key):
+        if not settings.SHARED_CACHE:
+            return self._queryset(key).first()
+        entry_key, generation_key = self._keys(key)
+        cached = cache.get_many([entry_key, generation_key])
+        generation, entry = cached.get(generation_key), cached.get(entry_key)
+        if entry is not None and entry[0] == generation:
+            self.stats.hit()
+            return entry[1]
+        self.stats.miss()
+        token = self._queryset(key).first()
+        if token is not None:
+            cache.set(entry_key, (generation, token), settings.TOKEN_CACHE_TIMEOUT)
+        return token
+
+    async def aget(self, key):
+        if not settings.SHARED_CACHE:
+            return await self._queryset(key).afirst()
+        entry_key, generation_key = self._keys(key)
+        cached = await cache.aget_many([entry_key, generation_key])
+        generation, entry = cached.get(generation_key), cached.get(entry_key)
+        if entry is not None and entry[0] == generation:
+            self.stats.hit()
+            return entry[1]
+        self.stats.miss()
+        token = await self._queryset(key).afirst()
+        if token is not None:
+            await cache.aset(entry_key, (generation, token), settings.TOKEN_CACHE_TIMEOUT)
+        return token
+
+    def invalidate(self, *keys):
+        if not settings.SHARED_CACHE or not keys:
+            return
+        keys = [self._keys(key) for key in keys]
+        cache.set_many({generation_key: uuid.uuid4().hex for _, generation_key in keys},
+                       settings.TOKEN_CACHE_TIMEOUT * 2)
+        cache.delete_many([entry_key for entry_key, _ in keys])
+
+    def invalidate_user(self, user_id):
+        if settings.SHARED_CACHE:
+            self.invalidate(*Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+    @staticmethod
+    def _queryset(key):
+        return Token.objects.select_related('user').defer('user__recipes_count', 'user__password').filter(key=key)
+
+    @staticmethod
+    def _keys(key):
+        digest = hashlib.md5(key.encode()).hexdigest()
+        return f'auth-token:{digest}', f'auth-token-generation:{digest}'
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, берущая токен и пользователя из token_cache."""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
@@ -2,14 +2,18 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from menu.counters import CounterFieldsMixin
 
-class CustomUser(AbstractUser):
+
+class CustomUser(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(unique=True, verbose_name='Электронная почта')
     avatar = models.ImageField(null=True, blank=True, verbose_name='Аватар')
     first_name = models.CharField(max_length=150, verbose_name='Имя')
     last_name = models.CharField(max_length=150, verbose_name='Фамилия')
+    recipes_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    counter_fields = ('recipes_count',)
 
     class Meta:
         ordering = ('email', 'username', 'first_name', 'last_name')
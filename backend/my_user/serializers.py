@@ -22,6 +22,8 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context['request'].user.is_authenticated:
             return self.context['request'].user.sub_sender.filter(to=obj).exists()
         return False
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Prefetch, Value
 from djoser.views import UserViewSet
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -12,7 +13,8 @@ from django.shortcuts import get_object_or_404
 
 from my_user.models import SubscriptionRelation
 from my_user.serializers import AvatarSerializer, UserSerializer
-from menu.serializers import SubscribedSerializer
+from menu.models import Recipe
+from menu.serializers import SubscribedSerializer, get_recipes_limit
 from rest_framework.exceptions import ValidationError, ParseError, NotFound
 
 User = get_user_model()
@@ -23,14 +25,24 @@ class PUserViewSet(UserViewSet):
 
     @action(detail=False, methods=['get'], url_path='subscriptions')
     def subscriptions(self, request):
-        subscriptions = SubscriptionRelation.objects.filter(sender=request.user)
-        page = self.paginate_queryset([sub.to for sub in subscriptions])
+        recipes = Recipe.objects.only('id', 'name', 'image', 'cooking_time', 'author_id')
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        subscriptions = User.objects.filter(
+            sub_to__sender=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+        ).order_by('username', 'id')
+        page = self.paginate_queryset(subscriptions)
         if page is not None:
             serializer = SubscribedSerializer(page,
                                               many=True,
                                               context={'request': request})
             return self.get_paginated_response(serializer.data)
-        serializer = SubscribedSerializer([sub.to for sub in subscriptions],
+        serializer = SubscribedSerializer(subscriptions,
                                           many=True,
                                           context={'request': request})
         return Response(serializer.data)
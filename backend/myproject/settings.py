@@ -44,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'menu.middleware.SQLInstrumentationMiddleware',
+    'menu.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'menu.middleware.ConcurrencyLimitMiddleware',
 ]
 
 ROOT_URLCONF = 'myproject.urls'
@@ -76,13 +79,79 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+SQLITE_PROFILES = {
+    'development': {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {},
+        'PRAGMAS': {},
+    },
+    'production': {
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'development')
+
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]['PRAGMAS']
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': SQLITE_PROFILES[SQLITE_PROFILE]['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_PROFILES[SQLITE_PROFILE]['OPTIONS'],
     }
 }
 
+DATABASE_REPLICA_ALIAS = 'replica'
+
+if os.getenv('REPLICA_DB_NAME'):
+    DATABASES[DATABASE_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('REPLICA_DB_NAME'),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'false').lower() == 'true'
+
+if ASYNC_READ_VIEWS:
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 0
+
+ASGI_CONCURRENCY_LIMIT = int(os.getenv('ASGI_CONCURRENCY_LIMIT', 8))
+
+DATABASE_ROUTERS = ['menu.db_router.PrimaryReplicaRouter']
+
+REPLICA_LAG_SECONDS = 5
+
+REPLICA_PIN_COOKIE_NAME = 'primary_pin'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+SHARED_CACHE = os.getenv(
+    'SHARED_CACHE', str(CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS)
+).lower() == 'true'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -103,7 +172,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'my_user.authentication.CachedTokenAuthentication',
     ],
     'PAGE_SIZE': 100,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
@@ -146,3 +215,51 @@ AUTH_USER_MODEL = "my_user.CustomUser"
 MIN_TIME = 1
 
 MAX_TIME = 32000
+
+INGREDIENT_INDEX_TTL = 300
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+RECIPE_INGREDIENT_INDEX_TTL = 300
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+
+RECIPE_SETS_CACHE_TIMEOUT = 300
+
+TOKEN_CACHE_TIMEOUT = 300
+
+RESPONSE_CACHE_TIMEOUT = 600
+
+CACHE_STATS_LOG_INTERVAL = 1000
+
+SQL_INSTRUMENTATION_SAMPLE_RATE = 1.0
+
+SQL_SLOW_REQUEST_MS = 500
+
+SQL_SLOW_QUERY_MS = 100
+
+SQL_DUPLICATE_QUERY_THRESHOLD = 3
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'menu.sql': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'menu.cache': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+TEST_RUNNER = 'myproject.test_runner.QuietLogsTestRunner'
@@ -0,0 +1,26 @@
+import logging
+
+from django.test.runner import DiscoverRunner
+
+QUIET_LOGGERS = ('menu.sql',)
+
+
+class QuietLogsTestRunner(DiscoverRunner):
+    """Запускает тесты без JSON-журнала медленных и повторяющихся SQL-запросов в stderr.
+
+    Уровень логгеров QUIET_LOGGERS поднимается до CRITICAL; тесты, которым нужны
+    эти записи, перехватывают их через assertLogs.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._logger_levels = {}
+        for name in QUIET_LOGGERS:
+            logger = logging.getLogger(name)
+            self._logger_levels[name] = logger.level
+            logger.setLevel(logging.CRITICAL)
+
+    def teardown_test_environment(self, **kwargs):
+        for name, level in self._logger_levels.items():
+            logging.getLogger(name).setLevel(level)
+        super().teardown_test_environment(**kwargs)
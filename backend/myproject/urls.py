@@ -16,7 +16,9 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from menu.views import IngredientListAPIView, IngredientDetailAPIView, RecipeViewSet, view_short_link
+from menu.async_views import async_read_view
+from menu.views import (IngredientListAPIView, IngredientDetailAPIView, RecipeViewSet, aview_short_link,
+                         view_short_link)
 from my_user.views import PUserViewSet
 
 from django.conf.urls.static import static
@@ -27,11 +29,30 @@ router = DefaultRouter()
 router.register('', PUserViewSet, basename='users')
 router_recipes = DefaultRouter()
 router_recipes.register('', RecipeViewSet, basename='recipes')
+
+if settings.ASYNC_READ_VIEWS:
+    async_read_urls = [
+        path('api/recipes/', async_read_view(RecipeViewSet, 'alist', {'get': 'list', 'post': 'create'},
+                                             basename='recipes', detail=False)),
+        path('api/recipes/<int:pk>/', async_read_view(
+            RecipeViewSet, 'aretrieve',
+            {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'},
+            basename='recipes', detail=True
+        )),
+    ]
+    ingredient_list_view = async_read_view(IngredientListAPIView, 'alist')
+    short_link_view = aview_short_link
+else:
+    async_read_urls = []
+    ingredient_list_view = IngredientListAPIView.as_view()
+    short_link_view = view_short_link
+
 urlpatterns = [path('admin/', admin.site.urls),
                path('api/auth/', include('djoser.urls.authtoken')),
                path('api/users/', include(router.urls)),
+               *async_read_urls,
                path('api/recipes/', include(router_recipes.urls)),
                path('api/ingredients/<int:pk>/', IngredientDetailAPIView.as_view(), name='ingredient-detail'),
-               path('api/ingredients/', IngredientListAPIView.as_view(), name='ingredient-list'),
-               path('s/<str:pk>', view_short_link, name='short-link'),
+               path('api/ingredients/', ingredient_list_view, name='ingredient-list'),
+               path('s/<str:pk>', short_link_view, name='short-link'),
                ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)